@@ -1,21 +1,34 @@
 #!/usr/bin/env python3
 # convert_webarchives_windows_longpath.py
-# Requirements: pip install pywebarchive tqdm requests
+# Requirements: pip install pywebarchive tqdm requests lxml
 # Optional: install wkhtmltopdf for PDF output
 
 import argparse
+import csv
+import errno
+import functools
+import io
+import locale
+import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
 import re
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import unicodedata
+from collections import deque
 from pathlib import Path, PurePath
-from typing import Tuple, List, Optional
+from typing import IO, Iterator, NamedTuple, Tuple, List, Optional, Union
 import urllib.parse
 import html as _html
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 try:
     import requests
@@ -32,6 +45,11 @@ try:
 except Exception:
     tqdm = None
 
+try:
+    from lxml import html as lxml_html
+except Exception:
+    lxml_html = None
+
 # ========== DEFAULT CONFIG ==========
 DEFAULT_SRC = Path(r"D:\usbwork")
 DEFAULT_OUT_HTML = Path(r"D:\USBhtml")
@@ -41,149 +59,344 @@ DEFAULT_WKHTMLTOPDF = Path(r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe")
 MAX_COMPONENT_LEN = 100
 MAX_STEM_LEN = 200
 USE_LONG_PATH_PREFIX = True
-INVALID_CHARS_RE = re.compile(r'[<>:"/\\|?*\x00-\x1F]')
-RESERVED_NAMES = {
+INVALID_CHARS_RE = re.compile(r'[<>:"/\\|?*\x00-\x1F]')  # kept for callers wanting the regex form
+# Same character set as INVALID_CHARS_RE, as a str.translate table (no regex engine per call)
+INVALID_CHARS_TABLE = str.maketrans({c: "_" for c in '<>:"/\\|?*' + "".join(chr(i) for i in range(32))})
+RESERVED_NAMES = frozenset({
     "CON", "PRN", "AUX", "NUL",
     *(f"COM{i}" for i in range(1, 10)),
     *(f"LPT{i}" for i in range(1, 10))
-}
+})
+# Reserved device names are 3 or 4 characters; anything else can skip the upper() copy.
+_RESERVED_LENS = range(3, 5)
 MIN_WEBARCHIVE_SIZE = 128
+# A binary plist starts with "bplist00" and an XML one with "<?xml ... plist", so the
+# header is enough for the quick content check.
+WEBARCHIVE_SNIFF_BYTES = 512
+_WA_MAGIC_RE = re.compile(rb'<\?xml|plist|AppleWebArchive|WebResource|WebMainResource|bplist00')
+# O_BINARY / O_SEQUENTIAL only exist (and only matter) on Windows
+_SNIFF_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_BINARY", 0) | getattr(os, "O_SEQUENTIAL", 0)
+WEBARCHIVE_SUFFIX = ".webarchive"
+_SUFFIX_LEN = len(WEBARCHIVE_SUFFIX)
 FETCH_TIMEOUT = 10  # seconds for network fetch of missing resources
+DEFAULT_JOBS = 0  # worker processes; 0 = os.cpu_count(), 1 = sequential
+# ProcessPoolExecutor raises ValueError for max_workers > 61 on Windows (WaitForMultipleObjects limit)
+MAX_POOL_WORKERS = 61 if os.name == "nt" else None
+PDF_ATTEMPTS = 3
+DEFAULT_PDF_WORKERS = 0  # concurrent wkhtmltopdf processes; 0 = os.cpu_count()
+DEFAULT_PDF_BATCH = 1  # HTML files rendered per wkhtmltopdf invocation
+POOL_CHUNK_MAX = 32  # files per process-pool task once the run is under way
+POOL_CHUNK_BYTES = 16 * 1024 * 1024  # source bytes per task; a bigger archive gets a task of its own
+DEFAULT_PREFETCH = 0  # source files read ahead into the OS cache; 0 = off
+PREFETCH_CHUNK = 1024 * 1024
+WRITE_CHUNK_CHARS = 1024 * 1024  # text is encoded for writing this many characters at a time
+_NEWLINE = os.linesep  # what text-mode writes for "\n" ("\r\n" on Windows)
 # ============================
 
+log = logging.getLogger("convert_webarchives")
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    # StreamHandler flushes after every record; when stdout is a pipe or a file let the
+    # stream's own buffering batch the writes instead of issuing one write per line.
+    def __init__(self, stream=None):
+        super().__init__(stream if stream is not None else sys.stdout)
+        self._interactive = bool(getattr(self.stream, "isatty", lambda: False)())
+
+    def flush(self):
+        if self._interactive:
+            super().flush()
+
+
+class _TqdmHandler(logging.Handler):
+    # Used while a progress bar is shown: tqdm.write() prints above the bar instead of
+    # through it.
+    def emit(self, record):
+        try:
+            tqdm.write(self.format(record), file=sys.stdout)
+        except Exception:
+            self.handleError(record)
+
 
+def setup_logging(level: int = logging.INFO, progress: bool = False):
+    # Per-file progress lines are logged at DEBUG; INFO keeps warnings, failures and the summary.
+    if not log.handlers:
+        handler = _TqdmHandler() if progress and tqdm is not None else _ConsoleHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+    log.setLevel(level)
+    log.propagate = False
+    # Keep line buffering for an interactive console; block-buffer when redirected.
+    reconfigure = getattr(sys.stdout, "reconfigure", None)
+    if reconfigure is not None:
+        reconfigure(line_buffering=sys.stdout.isatty())
+
+
+def _init_worker_logging(queue, level: int):
+    # Pool initializer: workers hand their records to the parent's QueueListener, which
+    # writes them from a single thread so lines from different workers never interleave.
+    log.handlers[:] = [logging.handlers.QueueHandler(queue)]
+    log.setLevel(level)
+    log.propagate = False
+
+
+# Directory names repeat for every file they contain, so the sanitizers are memoized.
+@functools.lru_cache(maxsize=65536)
 def safe_component(name: str, max_len: int = MAX_COMPONENT_LEN) -> str:
-    name = INVALID_CHARS_RE.sub("_", name)
-    name = name.rstrip(" .")
+    name = name.translate(INVALID_CHARS_TABLE).rstrip(" .")
     if not name:
         name = "_"
-    if name.upper() in RESERVED_NAMES:
+    elif len(name) in _RESERVED_LENS and name.upper() in RESERVED_NAMES:
         name = "_" + name
     if len(name) > max_len:
         name = name[:max_len]
     return name
 
 
+@functools.lru_cache(maxsize=65536)
 def safe_stem_with_ext(orig_name: str, stem_max: int = MAX_STEM_LEN) -> Tuple[str, str]:
-    stem, ext = os.path.splitext(orig_name)
-    stem = INVALID_CHARS_RE.sub("_", stem).rstrip(" .")
+    # os.path.splitext on a bare name, without its separator/altsep scan; leading dots
+    # belong to the stem (".foo" has no extension), as with splitext
+    i = orig_name.rfind(".")
+    if i > 0 and orig_name[:i].lstrip("."):
+        stem, ext = orig_name[:i], orig_name[i:]
+    else:
+        stem, ext = orig_name, ""
+    stem = stem.translate(INVALID_CHARS_TABLE).rstrip(" .")
     if not stem:
         stem = "_"
-    if stem.upper() in RESERVED_NAMES:
+    elif len(stem) in _RESERVED_LENS and stem.upper() in RESERVED_NAMES:
         stem = "_" + stem
     if len(stem) > stem_max:
         stem = stem[:stem_max]
-    ext = ext if ext else ""
     return stem, ext
 
 
-def ensure_parent(path: Path, dry_run: bool = False):
+# Directories already created by this process. Many outputs share a folder, so after the
+# first file the makedirs call (one or more syscalls) is skipped. Each worker process keeps
+# its own copy, emptied once it reaches _CREATED_DIRS_MAX entries (a forgotten directory
+# just costs one more exist_ok makedirs).
+_CREATED_DIRS = set()
+_CREATED_DIRS_MAX = 65536
+_CREATED_DIRS_LOCK = threading.Lock()
+
+
+def make_dirs(dir_path: Union[str, Path]):
+    key = os.fspath(dir_path)
+    if key in _CREATED_DIRS:
+        return
+    with _CREATED_DIRS_LOCK:
+        if key in _CREATED_DIRS:
+            return
+        os.makedirs(key, exist_ok=True)
+        if len(_CREATED_DIRS) >= _CREATED_DIRS_MAX:
+            _CREATED_DIRS.clear()
+        _CREATED_DIRS.add(key)
+
+
+def ensure_parent(path: Union[str, Path], dry_run: bool = False):
     if dry_run:
         return
-    path.parent.mkdir(parents=True, exist_ok=True)
+    make_dirs(os.path.dirname(os.fspath(path)))
 
 
-def add_long_path_prefix(path_input: str) -> str:
-    p = str(path_input)
-    p = os.path.abspath(p)
-    if os.name != 'nt' or not USE_LONG_PATH_PREFIX:
-        return p
+def add_long_path_prefix(path_input: Union[str, "os.PathLike[str]"]) -> str:
+    # Callers may pass a Path directly; it is converted exactly once here, and the cache
+    # below is keyed by that string so Path and str spellings share one entry.
+    return _long_path(os.fspath(path_input))
+
+
+@functools.lru_cache(maxsize=100000)
+def _long_path(p: str) -> str:
+    # Memoized: the same source/output paths are prefixed several times per file, and the
+    # working directory (the only other input) never changes.
     if p.startswith('\\\\?\\'):
         return p
+    drive, _ = os.path.splitdrive(p)
+    if drive and os.path.isabs(p):
+        p = os.path.normpath(p)  # already absolute: skip abspath's getcwd()
+    else:
+        p = os.path.abspath(p)
     if p.startswith('\\\\'):
         return '\\\\?\\UNC\\' + p.lstrip('\\')
     return '\\\\?\\' + p
 
 
+if os.name != 'nt' or not USE_LONG_PATH_PREFIX:
+    # Nothing to prefix: bind a cached abspath once at import instead of testing per call.
+    _long_path = functools.lru_cache(maxsize=100000)(os.path.abspath)
+
+
+# pywebarchive's attribute names vary between versions, so resources are probed with
+# several candidates. The name that exists is the same for every object of a type, so
+# it is remembered per (type, candidates) and later objects take a single getattr.
+_MIME_ATTRS = ("mimeType", "MIMEType", "mime", "contentType")
+_RES_URL_ATTRS = ("url", "URL", "path", "filename", "src")
+_ATTR_CACHE = {}
+_NOT_CACHED = object()
+
+
+def _probe_attr(obj, names: Tuple[str, ...]):
+    # getattr(obj, first of `names` that obj has), or None when it has none of them
+    key = (type(obj), names)
+    name = _ATTR_CACHE.get(key, _NOT_CACHED)
+    if name is None:
+        return None
+    if name is not _NOT_CACHED:
+        try:
+            return getattr(obj, name)
+        except Exception:
+            pass  # this instance differs from the first one seen; probe it in full
+    for name in names:
+        try:
+            value = getattr(obj, name)
+        except Exception:
+            continue
+        _ATTR_CACHE[key] = name
+        return value
+    # "none of them" is only safe to remember when instances cannot add attributes
+    if not hasattr(obj, "__dict__"):
+        _ATTR_CACHE[key] = None
+    return None
+
+
+_PRESENT_ATTRS = {}
+
+
+def _probe_attr_value(obj, names: Tuple[str, ...]):
+    # First non-empty value among `names`, like getattr(obj, a, None) or getattr(obj, b, None)
+    # or ...: an empty url falls back to the next candidate. For types whose instances cannot
+    # grow attributes of their own, which of `names` the type defines is remembered, so the
+    # missing ones are not looked up again.
+    key = (type(obj), names)
+    present = _PRESENT_ATTRS.get(key)
+    if present is None:
+        cls = type(obj)
+        if hasattr(obj, "__dict__") or hasattr(cls, "__getattr__"):
+            present = names
+        else:
+            present = _PRESENT_ATTRS[key] = tuple(n for n in names if hasattr(cls, n))
+    for name in present:
+        try:
+            value = getattr(obj, name)
+        except Exception:
+            continue
+        if value:
+            return value
+    return None
+
+
+def _write_all(fh: io.FileIO, data: bytes):
+    # Raw (unbuffered) writes may come up short, so keep writing the remainder.
+    view = memoryview(data)
+    while view:
+        view = view[fh.write(view):]
+
+
 def _write_text_file(path: str, text: str):
-    with open(path, "w", encoding="utf-8", errors="replace") as fh:
-        fh.write(text)
+    # Encodes with str.encode (one C call per slice) and writes the bytes unbuffered instead of
+    # going through a TextIOWrapper. Slicing keeps the encoded copy of a page with megabytes of
+    # inlined data to one chunk, and newlines are translated as text mode would have done.
+    with io.FileIO(path, "w") as fh:
+        for start in range(0, len(text), WRITE_CHUNK_CHARS):
+            chunk = text[start:start + WRITE_CHUNK_CHARS]
+            if _NEWLINE != "\n":
+                chunk = chunk.replace("\n", _NEWLINE)
+            _write_all(fh, chunk.encode("utf-8", "replace"))
 
 
-def _write_bytes_file(path: str, data: bytes):
-    with open(path, "wb") as fh:
-        fh.write(data)
+def _write_bytes_file(path: str, data: bytes, exclusive: bool = False):
+    # Unbuffered like _write_text_file: most subresources are small, and a BufferedWriter
+    # only adds an allocation and a copy in front of the one write. exclusive=True raises
+    # FileExistsError instead of replacing an existing file.
+    with io.FileIO(path, "x" if exclusive else "w") as fh:
+        _write_all(fh, data)
 
 
 # ---------- Helpers ----------
 
-def _build_index_from_wa(wa, src_name: str) -> str:
-    parts = [
-        "<!doctype html>",
-        "<html><head><meta charset='utf-8'>",
-        f"<title>Index of {src_name}</title>",
-        "</head><body>",
-        f"<h1>Index of resources in {src_name}</h1>",
-        "<ul>"
-    ]
+_SUBRESOURCE_ATTRS = ("subresources", "_subresources", "resources", "web_resources", "WebResources")
+
+
+def _collect_wa_resources(wa) -> Tuple[object, list]:
+    # (main resource or None, subresource list) for an archive. convert_to_html probes these
+    # once and passes them to the helpers that need them.
+    subs = []
+    for attr in _SUBRESOURCE_ATTRS:
+        # one getattr with a default: hasattr() first would run a property getter twice
+        try:
+            col = getattr(wa, attr, None)
+            if col:
+                subs = list(col)
+                break
+        except Exception:
+            pass
     try:
-        mr = getattr(wa, "main_resource", None) or getattr(wa, "_main_resource", None)
-        if mr:
-            name = getattr(mr, "url", None) or getattr(mr, "URL", None) or getattr(mr, "filename", None) or "main"
-            mime = getattr(mr, "mimeType", None) or getattr(mr, "MIMEType", None) or None
-            parts.append(f"<li>Main resource: {name} (mime={mime})</li>")
+        main = getattr(wa, "main_resource", None) or getattr(wa, "_main_resource", None)
+    except Exception:
+        main = None
+    return main, subs
+
+
+def _index_item(label: str, r, default_name: str) -> str:
+    name = _probe_attr_value(r, ("url", "URL", "filename")) or default_name
+    mime = _probe_attr_value(r, ("mimeType", "MIMEType")) or None
+    # names and mime types come from the archive, so escape them
+    return f"<li>{label}: {_html.escape(str(name))} (mime={_html.escape(str(mime))})</li>"
+
+
+def _build_index_from_wa(wa, main_res, src_name: str) -> str:
+    main_item = ""
+    try:
+        if main_res:
+            main_item = _index_item("Main resource", main_res, "main") + "\n"
     except Exception:
         pass
+    items = ""
     try:
         subs = None
         for attr in ("subresources", "_subresources", "subframe_archives", "subframe"):
-            if hasattr(wa, attr):
-                try:
-                    col = getattr(wa, attr)
-                    if col:
-                        subs = list(col) if isinstance(col, (list, tuple)) else list(col)
-                        break
-                except Exception:
-                    continue
+            try:
+                col = getattr(wa, attr, None)
+                if col:
+                    subs = list(col)
+                    break
+            except Exception:
+                continue
         if subs:
-            for i, r in enumerate(subs, start=1):
-                rname = getattr(r, "url", None) or getattr(r, "URL", None) or getattr(r, "filename", None) or f"resource_{i}"
-                rmime = getattr(r, "mimeType", None) or getattr(r, "MIMEType", None) or None
-                parts.append(f"<li>Resource: {rname} (mime={rmime})</li>")
+            items = "".join(_index_item("Resource", r, f"resource_{i}") + "\n" for i, r in enumerate(subs, start=1))
     except Exception:
         pass
-    parts.append("</ul></body></html>")
-    return "\n".join(parts)
+    title = _html.escape(src_name)
+    return (
+        "<!doctype html>\n"
+        "<html><head><meta charset='utf-8'>\n"
+        f"<title>Index of {title}</title>\n"
+        "</head><body>\n"
+        f"<h1>Index of resources in {title}</h1>\n"
+        "<ul>\n"
+        f"{main_item}{items}"
+        "</ul></body></html>"
+    )
 
 
 def _guess_html_resource_from_wa(wa) -> Tuple[Optional[str], Optional[str]]:
     candidates = []
     for attr in ("web_main_resource", "main_resource", "mainResource", "WebMainResource", "_main_resource"):
-        if hasattr(wa, attr):
-            mr = getattr(wa, attr)
-            if mr:
-                candidates.append(mr)
+        mr = getattr(wa, attr, None)
+        if mr:
+            candidates.append(mr)
     for attr in ("resources", "web_resources", "WebResources", "resourcesList", "subresources", "_subresources"):
-        if hasattr(wa, attr):
-            rcol = getattr(wa, attr)
-            if rcol:
-                try:
-                    if isinstance(rcol, (list, tuple)):
-                        for r in rcol:
-                            candidates.append(r)
-                    else:
-                        for r in rcol:
-                            candidates.append(r)
-                except Exception:
-                    pass
+        rcol = getattr(wa, attr, None)
+        if rcol:
+            try:
+                candidates.extend(rcol)
+            except Exception:
+                pass
 
     def inspect_resource_obj(obj):
-        mime = None
-        data = None
-        for mname in ("mimeType", "MIMEType", "mime", "contentType"):
-            if hasattr(obj, mname):
-                try:
-                    mime = getattr(obj, mname)
-                    break
-                except Exception:
-                    pass
-        for dname in ("data", "data_bytes", "content", "html", "value"):
-            if hasattr(obj, dname):
-                try:
-                    data = getattr(obj, dname)
-                    break
-                except Exception:
-                    pass
+        mime = _probe_attr(obj, _MIME_ATTRS)
+        data = _probe_attr(obj, ("data", "data_bytes", "content", "html", "value"))
         if mime is None and isinstance(obj, dict):
             for key in ("mimeType", "MIMEType", "mime", "contentType"):
                 if key in obj:
@@ -230,52 +443,191 @@ def _attempt_fetch(url: str) -> Optional[bytes]:
     return None
 
 
-def _extract_subresources_and_rewrite(html_text: str, wa, out_html_path: Path, rel_resources_dir: Path, fetch_missing: bool) -> str:
+_CSS_URL_RE = re.compile(r'url\(\s*([^)]+?)\s*\)', re.I)
+_URL_ATTRS = ("src", "href", "poster", "data-src", "data-hires")
+# Patterns for the regex rewrite, compiled once instead of per page
+_BASE_TAG_RE = re.compile(r"<base\s+[^>]*href\s*=\s*([\"'])(.*?)\1", re.I)
+_HEAD_TAG_RE = re.compile(r"(<head[^>]*>)", re.I)
+_SRCSET_DQ_RE = re.compile(r'srcset\s*=\s*"([^"]+)"', re.I)
+_SRCSET_SQ_RE = re.compile(r"srcset\s*=\s*'([^']+)'", re.I)
+# every rewritten attribute in one alternation, so the page is scanned once, not per attribute
+_ATTR_RE = re.compile("(" + "|".join(map(re.escape, _URL_ATTRS)) + r')\s*=\s*([\'"])(.*?)\2', re.I)
+
+
+# Resource URLs repeat across a page (and across pages of one site); parse/quote each once.
+_unquote = functools.lru_cache(maxsize=4096)(urllib.parse.unquote)
+_quote = functools.lru_cache(maxsize=4096)(urllib.parse.quote)
+
+
+@functools.lru_cache(maxsize=4096)
+def _split_url(u: str) -> Tuple[Optional[str], str, str]:
+    # What the resource loop needs from urlparse(u), parsed once per distinct URL: u without
+    # its scheme (None when it has none), the path, and the path's last segment.
+    parsed = urllib.parse.urlparse(u)
+    no_scheme = urllib.parse.urlunparse(parsed._replace(scheme="")) if parsed.scheme else None
+    name = PurePath(parsed.path).name if parsed.path else ""
+    return no_scheme, parsed.path, name
+
+
+# Extensions for the common, well-formed MIME types; anything else goes through the
+# substring checks in _ext_for_mime.
+_MIME_EXT = {
+    "image/jpeg": ".jpg", "image/jpg": ".jpg", "image/png": ".png", "image/gif": ".gif",
+    "image/svg+xml": ".svg", "text/css": ".css", "application/javascript": ".js",
+    "text/javascript": ".js", "text/html": ".html",
+}
+
+
+def _ext_for_mime(mime: str) -> str:
+    lm = mime.lower()
+    ext = _MIME_EXT.get(lm.split(";", 1)[0].strip())
+    if ext is not None:
+        return ext
+    if "jpeg" in lm or "jpg" in lm:
+        return ".jpg"
+    elif "png" in lm:
+        return ".png"
+    elif "gif" in lm:
+        return ".gif"
+    elif "svg" in lm:
+        return ".svg"
+    elif "css" in lm:
+        return ".css"
+    elif "javascript" in lm or "script" in lm:
+        return ".js"
+    elif "html" in lm or "text" in lm:
+        return ".html"
+    return ""
+
+
+def _local_for(url_to_local: dict, u: str) -> Optional[str]:
+    local = url_to_local.get(u)
+    if local is None and "%" in u:
+        local = url_to_local.get(_unquote(u))
+    return local
+
+
+def _rewrite_srcset(val: str, url_to_local: dict) -> str:
+    out_parts = []
+    for p in val.split(","):
+        comps = p.split()
+        if not comps:
+            continue
+        u = comps[0]
+        rest = " ".join(comps[1:])
+        newu = _local_for(url_to_local, u) or u
+        out_parts.append((newu + (" " + rest if rest else "")).strip())
+    return ", ".join(out_parts)
+
+
+# re.sub callbacks for the rewrite, module-level and bound with functools.partial so no
+# closure is rebuilt per page.
+def _css_url_repl(url_to_local: dict, m) -> str:
+    local = _local_for(url_to_local, m.group(1).strip().strip('\'"'))
+    if local:
+        return f'url("{local}")'
+    return m.group(0)
+
+
+def _srcset_repl(url_to_local: dict, m) -> str:
+    return 'srcset="%s"' % _rewrite_srcset(m.group(1), url_to_local)
+
+
+def _attr_repl(url_to_local: dict, m) -> str:
+    attr, quote_char, v = m.groups()
+    return f"{attr.lower()}={quote_char}{_local_for(url_to_local, v) or v}{quote_char}"
+
+
+def _rewrite_css_urls(css: str, url_to_local: dict) -> str:
+    return _CSS_URL_RE.sub(functools.partial(_css_url_repl, url_to_local), css)
+
+
+def _rewrite_html_tree(html_text: str, url_to_local: dict) -> str:
+    # One parse, one walk over the elements: attribute values come back unescaped, so a
+    # plain dict lookup replaces the old escape/quote text-replacement passes.
+    doc = lxml_html.document_fromstring(html_text)
+    if doc.find(".//base[@href]") is None:
+        head = doc.find("head")
+        if head is None:
+            head = doc.makeelement("head", {})
+            doc.insert(0, head)
+        head.insert(0, head.makeelement("base", {"href": "./"}))
+
+    for el in doc.iter():
+        if not isinstance(el.tag, str):
+            continue  # comments / processing instructions
+        for attr in _URL_ATTRS:
+            v = el.get(attr)
+            if v:
+                local = _local_for(url_to_local, v.strip())
+                if local:
+                    el.set(attr, local)
+        v = el.get("srcset")
+        if v:
+            el.set("srcset", _rewrite_srcset(v, url_to_local))
+        v = el.get("style")
+        if v and "url(" in v:
+            el.set("style", _rewrite_css_urls(v, url_to_local))
+        if el.tag == "style" and el.text:
+            el.text = _rewrite_css_urls(el.text, url_to_local)
+
+    # serialize the tree (keeping the page's DOCTYPE) only when the page had one; libxml2
+    # invents an HTML 4.0 DOCTYPE otherwise
+    has_doctype = html_text.lstrip()[:9].lower() == "<!doctype"
+    return lxml_html.tostring(doc.getroottree() if has_doctype else doc, encoding="unicode")
+
+
+def _rewrite_html_regex(html_text: str, url_to_local: dict) -> str:
+    # Fallback when lxml is missing or cannot parse the page.
+    if not _BASE_TAG_RE.search(html_text):
+        html_text, n = _HEAD_TAG_RE.subn(r"\1\n<base href=\"./\">", html_text, count=1)
+        if not n:
+            html_text = "<head><base href=\"./\"></head>\n" + html_text
+
+    rewritten = html_text
+
+    replace_srcset = functools.partial(_srcset_repl, url_to_local)
+    rewritten = _SRCSET_DQ_RE.sub(replace_srcset, rewritten)
+    rewritten = _SRCSET_SQ_RE.sub(replace_srcset, rewritten)
+
+    rewritten = _ATTR_RE.sub(functools.partial(_attr_repl, url_to_local), rewritten)
+
+    rewritten = _rewrite_css_urls(rewritten, url_to_local)
+
+    # Any remaining literal occurrence (plain, html-escaped or quoted) in one scan: a single
+    # alternation, longest key first, instead of three str.replace passes per URL. The
+    # lookbehind keeps a bare path key ("/s.css") from matching inside an already rewritten
+    # "resources/s.css".
+    variants = {}
+    for orig, local in sorted(url_to_local.items(), key=lambda kv: -len(kv[0])):
+        for k in (orig, _html.escape(orig), _quote(orig)):
+            if k:
+                variants.setdefault(k, local)
+    if variants:
+        keys = sorted(variants, key=len, reverse=True)
+        big_re = re.compile(r"(?<![\w.%-])(?:" + "|".join(map(re.escape, keys)) + ")")
+        rewritten = big_re.sub(lambda m: variants[m.group(0)], rewritten)
+
+    return rewritten
+
+
+def _extract_subresources_and_rewrite(html_text: str, main_res, subs: list, out_html_path: Path,
+                                      rel_resources_dir: Path, fetch_missing: bool) -> str:
     out_dir = out_html_path.parent
     resources_dir = out_dir / rel_resources_dir
-    resources_dir.mkdir(parents=True, exist_ok=True)
+    make_dirs(resources_dir)
 
-    resources = []
-    for attr in ("subresources", "_subresources", "resources", "web_resources", "WebResources"):
-        if hasattr(wa, attr):
-            try:
-                col = getattr(wa, attr)
-                if col:
-                    resources = list(col) if isinstance(col, (list, tuple)) else list(col)
-                    break
-            except Exception:
-                pass
-    try:
-        mr = getattr(wa, "main_resource", None) or getattr(wa, "_main_resource", None)
-        if mr:
-            resources.append(mr)
-    except Exception:
-        pass
+    resources = subs + [main_res] if main_res else list(subs)
 
     def probe(r):
-        orig = None
-        for name in ("url", "URL", "path", "filename", "src"):
-            if hasattr(r, name):
-                try:
-                    v = getattr(r, name)
-                    if v:
-                        orig = str(v)
-                        break
-                except Exception:
-                    pass
+        v = _probe_attr_value(r, _RES_URL_ATTRS)
+        orig = str(v) if v else None
         if orig is None and isinstance(r, dict):
-            for key in ("url", "URL", "path", "filename", "src"):
+            for key in _RES_URL_ATTRS:
                 if key in r and r[key]:
                     orig = str(r[key]); break
 
-        data = None
-        for dname in ("data", "data_bytes", "content", "value", "html"):
-            if hasattr(r, dname):
-                try:
-                    data = getattr(r, dname)
-                    break
-                except Exception:
-                    pass
+        data = _probe_attr(r, ("data", "data_bytes", "content", "value", "html"))
         if data is None and isinstance(r, dict):
             for key in ("data", "content", "html", "value"):
                 if key in r:
@@ -289,11 +641,36 @@ def _extract_subresources_and_rewrite(html_text: str, wa, out_html_path: Path, r
                 bytes_data = data.encode("utf-8")
             except Exception:
                 bytes_data = data.encode("latin-1", errors="replace")
-        mime = getattr(r, "mimeType", None) or getattr(r, "MIMEType", None) or (r.get("mimeType") if isinstance(r, dict) else None)
+        mime = _probe_attr_value(r, ("mimeType", "MIMEType")) or (r.get("mimeType") if isinstance(r, dict) else None)
         return orig, bytes_data, mime
 
     url_to_local = {}
 
+    # Every page in this output folder shares resources_dir, so names already there are off
+    # limits. List it once and pick names against that set, remembering the next "_N" per
+    # name, rather than stat'ing candidate after candidate for each resource.
+    try:
+        taken = {os.path.normcase(n) for n in os.listdir(add_long_path_prefix(resources_dir))}
+    except OSError:
+        taken = set()
+    next_suffix = {}
+
+    def claim_name(filename: str) -> str:
+        key = os.path.normcase(filename)
+        if key not in taken:
+            taken.add(key)
+            return filename
+        stem, suffix = os.path.splitext(filename)
+        i = next_suffix.get(key, 1)
+        while True:
+            name = f"{stem}_{i}{suffix}"
+            i += 1
+            if os.path.normcase(name) not in taken:
+                break
+        next_suffix[key] = i
+        taken.add(os.path.normcase(name))
+        return name
+
     for idx, r in enumerate(resources, start=1):
         orig_url, data_bytes, mime = probe(r)
         if not data_bytes and not orig_url:
@@ -301,39 +678,16 @@ def _extract_subresources_and_rewrite(html_text: str, wa, out_html_path: Path, r
 
         filename = None
         if orig_url:
-            parsed = urllib.parse.urlparse(orig_url)
-            candidate = Path(parsed.path).name if parsed.path else None
+            candidate = _split_url(orig_url)[2]
             if candidate:
                 filename = safe_component(candidate)
         if not filename:
             filename = f"resource_{idx}"
 
-        if not Path(filename).suffix:
-            ext = ""
-            if isinstance(mime, str):
-                lm = mime.lower()
-                if "jpeg" in lm or "jpg" in lm:
-                    ext = ".jpg"
-                elif "png" in lm:
-                    ext = ".png"
-                elif "gif" in lm:
-                    ext = ".gif"
-                elif "svg" in lm:
-                    ext = ".svg"
-                elif "css" in lm:
-                    ext = ".css"
-                elif "javascript" in lm or "script" in lm:
-                    ext = ".js"
-                elif "html" in lm or "text" in lm:
-                    ext = ".html"
-            if ext:
-                filename += ext
-
-        local_path = resources_dir / filename
-        i = 1
-        while local_path.exists():
-            local_path = resources_dir / f"{Path(filename).stem}_{i}{Path(filename).suffix}"
-            i += 1
+        if not Path(filename).suffix and isinstance(mime, str):
+            filename += _ext_for_mime(mime)
+
+        local_path = resources_dir / claim_name(filename)
 
         # If no embedded bytes, optionally fetch
         if not data_bytes and orig_url and fetch_missing:
@@ -349,17 +703,25 @@ def _extract_subresources_and_rewrite(html_text: str, wa, out_html_path: Path, r
                         fetched = None
             else:
                 # try the orig_url directly, and if it looks path-only, do not attempt
-                if urllib.parse.urlparse(orig_url).scheme in ("http", "https"):
+                if orig_url[:8].lower().startswith(("http://", "https://")):
                     fetched = _attempt_fetch(orig_url)
             if fetched:
                 data_bytes = fetched
 
         if data_bytes:
-            try:
-                _write_bytes_file(add_long_path_prefix(str(local_path)), data_bytes)
-            except Exception:
+            written = False
+            while not written:
                 try:
-                    _write_text_file(add_long_path_prefix(str(local_path)), data_bytes.decode("utf-8", errors="replace"))
+                    _write_bytes_file(add_long_path_prefix(local_path), data_bytes, exclusive=True)
+                    written = True
+                except FileExistsError:
+                    # a page converting into the same folder took the name after the listing
+                    local_path = resources_dir / claim_name(filename)
+                except Exception:
+                    break
+            if not written:
+                try:
+                    _write_text_file(add_long_path_prefix(local_path), data_bytes.decode("utf-8", errors="replace"))
                 except Exception:
                     continue
         else:
@@ -373,65 +735,35 @@ def _extract_subresources_and_rewrite(html_text: str, wa, out_html_path: Path, r
             if orig_url.startswith("//"):
                 url_to_local["http:" + orig_url] = rel_path
                 url_to_local["https:" + orig_url] = rel_path
-            parsed = urllib.parse.urlparse(orig_url)
-            if parsed.scheme:
-                url_to_local[urllib.parse.urlunparse(parsed._replace(scheme=""))] = rel_path
-                if parsed.path:
-                    url_to_local[parsed.path] = rel_path
-            else:
-                url_to_local[orig_url] = rel_path
+            no_scheme, url_path, _ = _split_url(orig_url)
+            if no_scheme is not None:
+                url_to_local[no_scheme] = rel_path
+                if url_path:
+                    url_to_local[url_path] = rel_path
             try:
-                url_to_local[urllib.parse.quote(orig_url, safe="")] = rel_path
+                url_to_local[_quote(orig_url, safe="")] = rel_path
             except Exception:
                 pass
+            # the decoded spelling too, so pages writing it unescaped hit the plain dict lookup
+            url_to_local.setdefault(_unquote(orig_url), rel_path)
 
-    base_match = re.search(r"<base\s+[^>]*href\s*=\s*([\"'])(.*?)\1", html_text, flags=re.I)
-    if not base_match:
-        if re.search(r"(?i)<head[^>]*>", html_text):
-            html_text = re.sub(r"(?i)(<head[^>]*>)", r"\1\n<base href=\"./\">", html_text, count=1)
-        else:
-            html_text = "<head><base href=\"./\"></head>\n" + html_text
-
-    rewritten = html_text
-
-    def replace_srcset(match):
-        val = match.group(1)
-        parts = [p.strip() for p in val.split(",")]
-        out_parts = []
-        for p in parts:
-            comps = p.split()
-            u = comps[0]
-            rest = " ".join(comps[1:]) if len(comps) > 1 else ""
-            newu = url_to_local.get(u, url_to_local.get(urllib.parse.unquote(u), u))
-            out_parts.append((newu + (" " + rest if rest else "")).strip())
-        return 'srcset="%s"' % (", ".join(out_parts))
-
-    rewritten = re.sub(r'srcset\s*=\s*"([^"]+)"', replace_srcset, rewritten, flags=re.I)
-    rewritten = re.sub(r"srcset\s*=\s*'([^']+)'", replace_srcset, rewritten, flags=re.I)
-
-    for attr in ("src", "href", "poster", "data-src", "data-hires"):
-        pattern = re.compile(rf'{attr}\s*=\s*([\'"])(.*?)\1', flags=re.I)
-        rewritten = pattern.sub(lambda m: f'{attr}={m.group(1)}{(url_to_local.get(m.group(2)) or url_to_local.get(urllib.parse.unquote(m.group(2))) or m.group(2))}{m.group(1)}', rewritten)
-
-    def css_url_repl(m):
-        inner = m.group(1).strip().strip('\'"')
-        local = url_to_local.get(inner) or url_to_local.get(urllib.parse.unquote(inner))
-        if local:
-            return f'url("{local}")'
-        return m.group(0)
-    rewritten = re.sub(r'url\(\s*([^)]+?)\s*\)', css_url_repl, rewritten, flags=re.I)
+    if not url_to_local:
+        # nothing was extracted, so no link can change; <base href="./"> only matters
+        # alongside rewritten relative links
+        return html_text
 
-    for orig, local in sorted(url_to_local.items(), key=lambda kv: -len(kv[0])):
+    rewritten = None
+    if lxml_html is not None:
         try:
-            rewritten = rewritten.replace(orig, local)
-            rewritten = rewritten.replace(_html.escape(orig), local)
-            rewritten = rewritten.replace(urllib.parse.quote(orig), local)
+            rewritten = _rewrite_html_tree(html_text, url_to_local)
         except Exception:
-            pass
+            rewritten = None  # unparseable (e.g. str with an XML encoding declaration); use the regex path
+    if rewritten is None:
+        rewritten = _rewrite_html_regex(html_text, url_to_local)
 
     # debug dump
     try:
-        print(f"    [debug] resources written for: {out_dir}")
+        log.debug(f"    [debug] resources written for: {out_dir}")
         printed = 0
         for orig, local in sorted(url_to_local.items(), key=lambda kv: -len(kv[0])):
             local_fs = (out_dir / local)
@@ -440,10 +772,10 @@ def _extract_subresources_and_rewrite(html_text: str, wa, out_html_path: Path, r
                 size = local_fs.stat().st_size
             except Exception:
                 size = None
-            print(f"      {orig} -> {local}  (exists={local_fs.exists()}, size={size})")
+            log.debug(f"      {orig} -> {local}  (exists={local_fs.exists()}, size={size})")
             printed += 1
             if printed >= 200:
-                print("      [debug] ... truncated list")
+                log.debug("      [debug] ... truncated list")
                 break
     except Exception:
         pass
@@ -452,25 +784,51 @@ def _extract_subresources_and_rewrite(html_text: str, wa, out_html_path: Path, r
 
 
 # ----------------- Conversion ----------------- #
-def convert_to_html(src_path: Path, html_dest: Path, dry_run: bool = False,
-                    inline_resources: bool = False, fetch_missing: bool = False):
+class ParsedArchive(NamedTuple):
+    # A WebArchive already opened by is_valid_webarchive_by_parsing, handed on to
+    # convert_to_html so a validated file is parsed only once. html_text is the to_html()
+    # result when validation produced one, else None.
+    wa: object
+    html_text: Optional[str]
+
+
+def convert_to_html(src_path: Union[str, Path], html_dest: Union[str, Path], dry_run: bool = False,
+                    inline_resources: bool = False, fetch_missing: bool = False,
+                    parsed: Optional[ParsedArchive] = None):
     ensure_parent(html_dest, dry_run=dry_run)
     if dry_run:
         return
     if WebArchive is None:
         raise RuntimeError("pywebarchive not installed; pip install pywebarchive")
 
-    web_src = add_long_path_prefix(str(src_path))
-    web_out = add_long_path_prefix(str(html_dest))
+    web_src = add_long_path_prefix(src_path)
+    web_out = add_long_path_prefix(html_dest)
+    if inline_resources:
+        html_dest = Path(html_dest)
+
+    wa = parsed.wa if parsed is not None else WebArchive(web_src)
+    # (main_res, subs) is probed the first time a branch needs it: the plain to_html() path
+    # never does, and the inline rewrite, main-resource fallback and index share one probe.
+    collected = []
+
+    def resources() -> Tuple[object, list]:
+        if not collected:
+            collected.append(_collect_wa_resources(wa))
+        return collected[0]
 
-    wa = WebArchive(web_src)
+    def rewrite(text: str) -> str:
+        main_res, subs = resources()
+        return _extract_subresources_and_rewrite(text, main_res, subs, html_dest, Path("resources"), fetch_missing)
 
     if hasattr(wa, "to_html"):
         try:
-            html_text = wa.to_html()
+            if parsed is not None and parsed.html_text is not None:
+                html_text = parsed.html_text
+            else:
+                html_text = wa.to_html()
             if html_text:
                 if inline_resources:
-                    html_text = _extract_subresources_and_rewrite(html_text, wa, html_dest, Path("resources"), fetch_missing)
+                    html_text = rewrite(html_text)
                 _write_text_file(web_out, html_text)
                 return
         except Exception:
@@ -480,23 +838,16 @@ def convert_to_html(src_path: Path, html_dest: Path, dry_run: bool = False,
         mime, html_text = _guess_html_resource_from_wa(wa)
         if mime and html_text:
             if inline_resources:
-                html_text = _extract_subresources_and_rewrite(html_text, wa, html_dest, Path("resources"), fetch_missing)
+                html_text = rewrite(html_text)
             _write_text_file(web_out, html_text)
             return
     except Exception:
         pass
 
     try:
-        mr = getattr(wa, "main_resource", None) or getattr(wa, "_main_resource", None)
-        if mr:
-            data = None
-            for key in ("data", "data_bytes", "content", "html"):
-                if hasattr(mr, key):
-                    try:
-                        data = getattr(mr, key)
-                        break
-                    except Exception:
-                        continue
+        main_res = resources()[0]
+        if main_res:
+            data = _probe_attr(main_res, ("data", "data_bytes", "content", "html"))
             if isinstance(data, (bytes, bytearray)):
                 try:
                     text = data.decode("utf-8")
@@ -507,18 +858,18 @@ def convert_to_html(src_path: Path, html_dest: Path, dry_run: bool = False,
                         text = None
                 if text:
                     if inline_resources:
-                        text = _extract_subresources_and_rewrite(text, wa, html_dest, Path("resources"), fetch_missing)
+                        text = rewrite(text)
                     _write_text_file(web_out, text)
                     return
             if isinstance(data, str):
                 if inline_resources:
-                    data = _extract_subresources_and_rewrite(data, wa, html_dest, Path("resources"), fetch_missing)
+                    data = rewrite(data)
                 _write_text_file(web_out, data)
                 return
     except Exception:
         pass
 
-    idx = _build_index_from_wa(wa, src_path.name)
+    idx = _build_index_from_wa(wa, resources()[0], os.path.basename(src_path))
     _write_text_file(web_out, idx)
     return
 
@@ -527,227 +878,385 @@ def convert_to_html(src_path: Path, html_dest: Path, dry_run: bool = False,
 def safe_pdf_filename(orig_name: str, max_stem: int = 180) -> str:
     name = unicodedata.normalize("NFKC", orig_name)
     stem = str(PurePath(name).stem)
-    stem = INVALID_CHARS_RE.sub("_", stem)
-    stem = stem.rstrip(" .")
+    stem = stem.translate(INVALID_CHARS_TABLE).rstrip(" .")
     if not stem:
         stem = "_"
-    if stem.upper() in RESERVED_NAMES:
+    elif len(stem) in _RESERVED_LENS and stem.upper() in RESERVED_NAMES:
         stem = "_" + stem
     if len(stem) > max_stem:
         stem = stem[:max_stem]
     return stem + ".pdf"
 
 
-def html_to_pdf(html_path: Path, pdf_dest: Path, wkhtml_path: Path, dry_run: bool = False):
-    if dry_run:
-        return
-    wk = str(wkhtml_path) if wkhtml_path else None
-    if not wk or not os.path.isfile(wk):
-        raise FileNotFoundError("wkhtmltopdf not configured or not found at: " + str(wkhtml_path))
+WKHTML_ARGS = [
+    '--load-error-handling', 'ignore',
+    '--load-media-error-handling', 'ignore',
+    '--enable-local-file-access',
+    '--no-stop-slow-scripts',
+    '--disable-smart-shrinking',
+]
 
-    pdf_dest_parent = pdf_dest.parent
-    pdf_dest_parent.mkdir(parents=True, exist_ok=True)
 
-    sanitized = safe_pdf_filename(pdf_dest.name)
-    final_pdf_path = pdf_dest_parent / sanitized
+class PdfJob(NamedTuple):
+    proc: subprocess.Popen
+    stderr: IO[bytes]
+    outputs: List[Tuple[str, str]]  # (temp pdf, final pdf) per input, in submission order
 
-    tmp_fd, tmp_path = tempfile.mkstemp(prefix="wkpdf_", suffix=".pdf", dir=str(pdf_dest_parent))
-    os.close(tmp_fd)
-    tmp_path_noprefix = os.path.abspath(tmp_path)
-    dst_path_noprefix = os.path.abspath(str(final_pdf_path))
 
+def _remove_quietly(path: str):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
+def _html_file_url(html_path: Union[str, Path]) -> str:
     src_path_noprefix = os.path.abspath(str(html_path))
     drive, _ = os.path.splitdrive(src_path_noprefix)
     if drive:
         path_for_url = "/" + src_path_noprefix.replace("\\", "/")
     else:
         path_for_url = src_path_noprefix
-    file_url = "file://" + urllib.parse.quote(path_for_url, safe="/:?&=#")
-
-    cmd = [
-        str(wk),
-        '--load-error-handling', 'ignore',
-        '--load-media-error-handling', 'ignore',
-        '--enable-local-file-access',
-        '--no-stop-slow-scripts',
-        '--disable-smart-shrinking',
-        file_url,
-        tmp_path_noprefix
-    ]
+    return "file://" + urllib.parse.quote(path_for_url, safe="/:?&=#")
+
+
+def _stdin_arg(arg: str) -> str:
+    # quoting understood by wkhtmltopdf's --read-args-from-stdin line parser
+    return '"' + arg.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def final_pdf_path(pdf_dest: Union[str, Path]) -> str:
+    # Where html_to_pdf actually writes: pdf_dest's folder plus the sanitized PDF name.
+    parent, name = os.path.split(os.fspath(pdf_dest))
+    return os.path.join(parent, safe_pdf_filename(name))
+
+
+def start_html_to_pdf_batch(pairs: List[Tuple[Union[str, Path], Union[str, Path]]], wkhtml_path: Path) -> PdfJob:
+    # Launches one wkhtmltopdf for all (html, pdf) pairs without waiting, so the caller can
+    # overlap it with other work; pair with finish_html_to_pdf_batch(). A single pair is passed
+    # on the command line; several are fed one job per line via --read-args-from-stdin, which
+    # renders each line to its own output with the flags given on the command line.
+    wk = str(wkhtml_path) if wkhtml_path else None
+    if not wk or not os.path.isfile(wk):
+        raise FileNotFoundError("wkhtmltopdf not configured or not found at: " + str(wkhtml_path))
 
+    outputs: List[Tuple[str, str]] = []
+    err_fh = None
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        try:
-            if os.path.exists(dst_path_noprefix):
-                os.remove(dst_path_noprefix)
-            os.replace(tmp_path_noprefix, dst_path_noprefix)
-        except Exception as me:
+        urls = []
+        for html_path, pdf_dest in pairs:
+            dst_path = final_pdf_path(pdf_dest)
+            pdf_dest_parent = os.path.dirname(dst_path)
+            make_dirs(pdf_dest_parent)
+
+            tmp_fd, tmp_path = tempfile.mkstemp(prefix="wkpdf_", suffix=".pdf", dir=pdf_dest_parent)
+            os.close(tmp_fd)
+            outputs.append((os.path.abspath(tmp_path), os.path.abspath(dst_path)))
+            urls.append(_html_file_url(html_path))
+
+        # stderr goes to a temp file rather than a pipe so a chatty wkhtmltopdf can't block
+        # on a full pipe buffer while nobody is reading it.
+        err_fh = tempfile.TemporaryFile()
+        if len(outputs) == 1:
+            cmd = [wk, *WKHTML_ARGS, urls[0], outputs[0][0]]
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=err_fh)
+        else:
+            # wkhtmltopdf reads stdin lines as local 8-bit text; fail fast (and let the caller
+            # fall back to per-file runs) if a temp path can't be represented.
+            script = "".join(
+                f"{_stdin_arg(url)} {_stdin_arg(tmp)}\n" for url, (tmp, _) in zip(urls, outputs)
+            ).encode(locale.getpreferredencoding(False))
+            cmd = [wk, *WKHTML_ARGS, '--read-args-from-stdin']
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err_fh)
             try:
-                if os.path.exists(tmp_path_noprefix):
-                    os.remove(tmp_path_noprefix)
-            except Exception:
-                pass
-            raise RuntimeError(f"wkhtmltopdf wrote temp PDF but moving to final location failed: {me}")
-    except subprocess.CalledProcessError as e:
-        try:
-            if os.path.exists(tmp_path_noprefix):
-                os.remove(tmp_path_noprefix)
-        except Exception:
-            pass
-        err = e.stderr.strip() if hasattr(e, 'stderr') else str(e)
-        raise RuntimeError(f"wkhtmltopdf failed (exit {e.returncode}): {err}") from e
+                proc.stdin.write(script)
+            finally:
+                proc.stdin.close()
     except Exception:
-        try:
-            if os.path.exists(tmp_path_noprefix):
-                os.remove(tmp_path_noprefix)
-        except Exception:
-            pass
+        if err_fh is not None:
+            err_fh.close()
+        for tmp, _ in outputs:
+            _remove_quietly(tmp)
         raise
+    return PdfJob(proc, err_fh, outputs)
 
 
-# ---------- Validation and file discovery ----------
-
-def is_likely_webarchive_file(path: Path, min_size: int = MIN_WEBARCHIVE_SIZE) -> bool:
-    if path.name.startswith("._"):
-        return False
-    if not path.is_file():
-        return False
-    if path.suffix.lower() != ".webarchive":
+@functools.lru_cache(maxsize=None)
+def wkhtml_reads_args_from_stdin(wkhtml_path: Path) -> bool:
+    # Older or stripped-down wkhtmltopdf builds lack --read-args-from-stdin; ask once.
+    try:
+        out = subprocess.run([str(wkhtml_path), '--extended-help'], stdin=subprocess.DEVNULL,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60).stdout
+    except Exception:
         return False
+    return b'--read-args-from-stdin' in out
+
+
+def start_html_to_pdf_stream(wkhtml_path: Path) -> PdfJob:
+    # Starts an empty --read-args-from-stdin job; pages are queued with add_html_to_pdf_stream()
+    # while it runs, and finish_html_to_pdf_batch() ends the input and collects the results.
+    wk = str(wkhtml_path) if wkhtml_path else None
+    if not wk or not os.path.isfile(wk):
+        raise FileNotFoundError("wkhtmltopdf not configured or not found at: " + str(wkhtml_path))
+    err_fh = tempfile.TemporaryFile()
     try:
-        size = path.stat().st_size
+        proc = subprocess.Popen([wk, *WKHTML_ARGS, '--read-args-from-stdin'],
+                                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err_fh)
     except Exception:
+        err_fh.close()
+        raise
+    return PdfJob(proc, err_fh, [])
+
+
+def add_html_to_pdf_stream(job: PdfJob, html_path: Union[str, Path], pdf_dest: Union[str, Path]):
+    # wkhtmltopdf renders each stdin line as soon as it arrives, so this page starts while the
+    # caller is still producing the next ones. On failure nothing is recorded in job.outputs.
+    dst_path = final_pdf_path(pdf_dest)
+    pdf_dest_parent = os.path.dirname(dst_path)
+    make_dirs(pdf_dest_parent)
+    tmp_fd, tmp_path = tempfile.mkstemp(prefix="wkpdf_", suffix=".pdf", dir=pdf_dest_parent)
+    os.close(tmp_fd)
+    tmp_path = os.path.abspath(tmp_path)
+    try:
+        line = f"{_stdin_arg(_html_file_url(html_path))} {_stdin_arg(tmp_path)}\n"
+        job.proc.stdin.write(line.encode(locale.getpreferredencoding(False)))
+        job.proc.stdin.flush()
+    except Exception:
+        _remove_quietly(tmp_path)
+        raise
+    job.outputs.append((tmp_path, os.path.abspath(dst_path)))
+
+
+def _end_stdin(job: PdfJob):
+    if job.proc.stdin is not None and not job.proc.stdin.closed:
+        try:
+            job.proc.stdin.close()
+        except OSError:
+            pass  # process already gone; its exit status tells the rest
+
+
+def finish_html_to_pdf_batch(job: PdfJob) -> List[Optional[Exception]]:
+    # Waits for the job and moves each finished PDF into place; returns one error (or None)
+    # per input so callers can retry only what failed.
+    results: List[Optional[Exception]] = []
+    try:
+        _end_stdin(job)
+        returncode = job.proc.wait()
+        if returncode != 0:
+            job.stderr.seek(0)
+            err = job.stderr.read().decode("utf-8", errors="replace").strip()
+            failure = RuntimeError(f"wkhtmltopdf failed (exit {returncode}): {err}")
+            return [failure] * len(job.outputs)
+        for tmp_path, dst_path in job.outputs:
+            # a stdin-fed job exits 0 even when one of its lines failed
+            if job.proc.stdin is not None:
+                try:
+                    empty = not os.path.getsize(tmp_path)
+                except OSError as e:
+                    # temp file gone: fail this page only, not the whole run
+                    results.append(RuntimeError(f"wkhtmltopdf output missing: {e}"))
+                    continue
+                if empty:
+                    results.append(RuntimeError("wkhtmltopdf produced no output"))
+                    continue
+            try:
+                if os.path.exists(dst_path):
+                    os.remove(dst_path)
+                os.replace(tmp_path, dst_path)
+                results.append(None)
+            except Exception as me:
+                results.append(RuntimeError(f"wkhtmltopdf wrote temp PDF but moving to final location failed: {me}"))
+        return results
+    finally:
+        job.stderr.close()
+        for tmp_path, _ in job.outputs:
+            _remove_quietly(tmp_path)
+
+
+def start_html_to_pdf(html_path: Union[str, Path], pdf_dest: Union[str, Path], wkhtml_path: Path) -> PdfJob:
+    return start_html_to_pdf_batch([(html_path, pdf_dest)], wkhtml_path)
+
+
+def finish_html_to_pdf(job: PdfJob):
+    err = finish_html_to_pdf_batch(job)[0]
+    if err is not None:
+        raise err
+
+
+def html_to_pdf(html_path: Union[str, Path], pdf_dest: Union[str, Path], wkhtml_path: Path, dry_run: bool = False):
+    if dry_run:
+        return
+    finish_html_to_pdf(start_html_to_pdf(html_path, pdf_dest, wkhtml_path))
+
+
+# ---------- Validation and file discovery ----------
+
+def is_likely_webarchive_file(path: Union[str, Path], min_size: int = MIN_WEBARCHIVE_SIZE,
+                              size: Optional[int] = None) -> bool:
+    # `size` is the st_size the directory scan already has for this entry; the scan has also
+    # established that it is a regular .webarchive file, so those checks are skipped.
+    if os.path.basename(path).startswith("._"):
         return False
+    if size is None:
+        if os.fspath(path)[-_SUFFIX_LEN:].lower() != WEBARCHIVE_SUFFIX:
+            return False
+        # one stat for both the regular-file check and the size
+        try:
+            st = os.stat(path)
+        except Exception:
+            return False
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        size = st.st_size
     if size < min_size:
         return False
     try:
-        with path.open("rb") as fh:
-            chunk = fh.read(8192)
+        fd = os.open(path, _SNIFF_OPEN_FLAGS)
+        try:
+            chunk = os.read(fd, WEBARCHIVE_SNIFF_BYTES)
+        finally:
+            os.close(fd)
     except Exception:
         return False
-    markers = [b'<?xml', b'plist', b'AppleWebArchive', b'WebResource', b'WebMainResource', b'bplist00']
-    return any(m in chunk for m in markers)
+    return _WA_MAGIC_RE.search(chunk) is not None
 
 
-def is_valid_webarchive_by_parsing(path: Path, dry_run: bool = False) -> Tuple[bool, str]:
+def is_valid_webarchive_by_parsing(path: Union[str, Path], dry_run: bool = False) -> Tuple[bool, str, Optional[ParsedArchive]]:
+    # On success also returns the parsed archive, for convert_to_html(parsed=...).
     if WebArchive is None:
-        return False, "pywebarchive not installed"
+        return False, "pywebarchive not installed", None
     if dry_run:
-        return True, "dry-run: parsing skipped"
+        return True, "dry-run: parsing skipped", None
     try:
-        wa = WebArchive(add_long_path_prefix(str(path)))
+        wa = WebArchive(add_long_path_prefix(path))
     except Exception as e:
-        return False, f"pywebarchive init failed: {e}"
-    fd = None
-    tmp_path = None
-    try:
-        fd, tmp_path = tempfile.mkstemp(prefix="wa_check_", suffix=".html")
-        os.close(fd)
-        tmp_out = add_long_path_prefix(tmp_path)
-        try:
-            if hasattr(wa, "to_html"):
-                try:
-                    text = wa.to_html()
-                    if text:
-                        _write_text_file(tmp_out, text)
-                        return True, ""
-                except Exception:
-                    pass
-        except Exception:
-            pass
+        return False, f"pywebarchive init failed: {e}", None
+    # Validation only needs to know that some HTML can be produced; nothing is written.
+    if hasattr(wa, "to_html"):
         try:
-            mr = getattr(wa, "main_resource", None) or getattr(wa, "_main_resource", None)
-            if mr:
-                data = None
-                for key in ("data", "data_bytes", "content", "html"):
-                    if hasattr(mr, key):
-                        try:
-                            data = getattr(mr, key)
-                            break
-                        except Exception:
-                            continue
-                if isinstance(data, (bytes, bytearray)):
-                    try:
-                        text = data.decode("utf-8")
-                    except Exception:
-                        try:
-                            text = data.decode("latin-1")
-                        except Exception:
-                            text = None
-                    if text:
-                        _write_text_file(tmp_out, text)
-                        return True, ""
-                if isinstance(data, str):
-                    _write_text_file(tmp_out, data)
-                    return True, ""
+            text = wa.to_html()
+            if text:
+                return True, "", ParsedArchive(wa, text)
         except Exception:
             pass
+    # Without to_html() output, convert_to_html falls back to the main resource and finally
+    # to a generated resource index, which cannot fail, so a parsed archive always converts.
+    # Building (and discarding) that index here proved nothing; the archive is valid.
+    return True, "", ParsedArchive(wa, None)
+
+
+def iter_webarchive_entries(src_root: Path) -> Iterator[os.DirEntry]:
+    # os.scandir with an explicit stack: names and entry types come straight from the
+    # directory listing, with no per-entry stat() and no per-directory lists as in os.walk.
+    # Directories are visited in the same top-down order os.walk would use.
+    stack = [os.fspath(src_root)]
+    while stack:
+        subdirs = []
         try:
-            idx = _build_index_from_wa(wa, path.name)
-            _write_text_file(tmp_out, idx)
-            return True, ""
-        except Exception as e:
-            return False, f"fallback index generation failed: {e}"
-    except Exception as e:
-        return False, f"temp file error: {e}"
-    finally:
-        try:
-            if tmp_path and os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except Exception:
-            pass
+            with os.scandir(stack.pop()) as it:
+                for de in it:
+                    if de.is_dir(follow_symlinks=False):
+                        subdirs.append(de.path)
+                    # lowercase only the 11-char tail, not a copy of every name in the tree;
+                    # is_file() comes from the listing too (no stat unless the type is unknown)
+                    elif de.name[-_SUFFIX_LEN:].lower() == WEBARCHIVE_SUFFIX and de.is_file(follow_symlinks=False):
+                        yield de
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+
+def iter_webarchive_files(src_root: Path) -> Iterator[Path]:
+    for de in iter_webarchive_entries(src_root):
+        yield Path(de.path)
 
 
 def gather_webarchive_files(src_root: Path) -> List[Path]:
-    files: List[Path] = []
-    for root, dirs, filenames in os.walk(src_root):
-        for fn in filenames:
-            if fn.lower().endswith('.webarchive'):
-                files.append(Path(root) / fn)
-    return files
+    return list(iter_webarchive_files(src_root))
+
+
+def count_webarchive_files(src_root: Path, skip_sidecars: bool = False) -> int:
+    # Same scan as iter_webarchive_entries, for callers that want a total up front without
+    # holding the whole path list (no Path objects are built).
+    return sum(1 for de in iter_webarchive_entries(src_root)
+               if not (skip_sidecars and is_sidecar(de)))
+
+
+def is_sidecar(de: os.DirEntry) -> bool:
+    # AppleDouble metadata file ("._name.webarchive") left behind by macOS on FAT/exFAT drives
+    return de.name.startswith("._")
+
+
+def move_sidecar(de: os.DirEntry, src_root: Union[str, Path], failed_root: Union[str, Path],
+                 dry_run: bool = False) -> bool:
+    try:
+        try:
+            rel = str(Path(os.path.dirname(de.path)).relative_to(src_root))
+        except Exception:
+            rel = ""
+        move_failed(de.path, failed_root, "" if rel == "." else rel, dry_run=dry_run)
+        return True
+    except Exception as e:
+        log.info(f"    Failed to move sidecar {de.path}: {e}")
+        return False
 
 
 def clean_sidecars_to_failed(src_root: Path, failed_root: Path, dry_run: bool = False) -> int:
     moved = 0
-    for root, dirs, filenames in os.walk(src_root):
-        for fn in filenames:
-            if fn.startswith("._") and fn.lower().endswith(".webarchive"):
-                src_file = Path(root) / fn
-                try:
-                    try:
-                        rel = Path(root).relative_to(src_root)
-                    except Exception:
-                        rel = Path(".")
-                    move_failed(src_file, failed_root, rel, dry_run=dry_run)
-                    moved += 1
-                except Exception as e:
-                    print(f"    Failed to move sidecar {src_file}: {e}")
+    for de in iter_webarchive_entries(src_root):
+        if is_sidecar(de) and move_sidecar(de, src_root, failed_root, dry_run=dry_run):
+            moved += 1
     return moved
 
 
-def move_failed(src_file: Path, failed_root: Path, rel_root: Path, dry_run: bool = False):
-    dest = failed_root / rel_root / src_file.name
+def move_failed(src_file: Union[str, Path], failed_root: Union[str, Path], rel_root: Union[str, Path], dry_run: bool = False):
+    dest = os.path.join(failed_root, rel_root, os.path.basename(src_file))
     if dry_run:
-        print(f"    [dry-run] would move {src_file} -> {dest}")
+        log.info(f"    [dry-run] would move {src_file} -> {dest}")
+        return
+    make_dirs(os.path.dirname(dest))
+    s = add_long_path_prefix(src_file)
+    d = add_long_path_prefix(dest)
+    try:
+        # same-volume rename (the usual case); replaces an older copy left in failed/
+        os.replace(s, d)
         return
-    dest.parent.mkdir(parents=True, exist_ok=True)
-    s = add_long_path_prefix(str(src_file))
-    d = add_long_path_prefix(str(dest))
+    except OSError as e:
+        # only a cross-volume move (ERROR_NOT_SAME_DEVICE maps to EXDEV on Windows) needs
+        # a copy; anything else (locked file, permissions) is reported as it is
+        if e.errno != errno.EXDEV:
+            raise RuntimeError(f"Failed to move failed file {src_file}: {e}") from e
     try:
-        shutil.move(s, d)
+        shutil.copy2(s, d)
+        os.remove(s)
+    except Exception as e2:
+        raise RuntimeError(f"Failed to move or copy failed file {src_file}: {e2}") from e2
+
+
+@functools.lru_cache(maxsize=65536)
+def truncate_rel_parts(rel_s: str) -> str:
+    # rel_s is a str(Path), so os.sep is the only separator; "" or "." means the root.
+    return os.sep.join(safe_component(part, MAX_COMPONENT_LEN)
+                       for part in rel_s.split(os.sep) if part and part != ".")
+
+
+@functools.lru_cache(maxsize=65536)
+def output_rel_root(src_dir: str, src_root: str) -> str:
+    # Sanitized output subfolder for a source directory, as a string ready for os.path.join
+    # ("" for the root itself); computed once per directory.
+    try:
+        rel_root = Path(src_dir).relative_to(src_root)
     except Exception:
-        try:
-            shutil.copy2(s, d)
-            os.remove(s)
-        except Exception as e2:
-            raise RuntimeError(f"Failed to move or copy failed file {src_file}: {e2}") from e2
+        return ""
+    return truncate_rel_parts(str(rel_root))
 
 
-def truncate_rel_parts(rel: Path) -> Path:
-    parts = []
-    for part in rel.parts:
-        parts.append(safe_component(part, MAX_COMPONENT_LEN))
-    return Path(*parts) if parts else Path("")
+@functools.lru_cache(maxsize=65536)
+def output_dir(out_root: str, rel_root: str) -> str:
+    # An output root joined with a directory's sanitized subfolder; every file of that
+    # directory shares the result, so only the file name is joined per file.
+    return os.path.join(out_root, rel_root)
 
 
 def process_single_file(src_file: Path, out_html_root: Path, out_pdf_root: Path,
@@ -759,17 +1268,19 @@ def process_single_file(src_file: Path, out_html_root: Path, out_pdf_root: Path,
             return False, "source file not found"
         if not is_likely_webarchive_file(src_file):
             return False, "heuristic validation failed"
+        parsed = None
         if validate:
-            valid, msg = is_valid_webarchive_by_parsing(src_file, dry_run=dry_run)
+            valid, msg, parsed = is_valid_webarchive_by_parsing(src_file, dry_run=dry_run)
             if not valid:
                 return False, f"parsing validation failed: {msg}"
         rel_root = Path(".")
         safe_stem, _ = safe_stem_with_ext(src_file.name)
         out_html = out_html_root / rel_root / (safe_stem + ".html")
         out_pdf = out_pdf_root / rel_root / (safe_stem + ".pdf")
-        convert_to_html(src_file, out_html, dry_run=dry_run, inline_resources=inline_resources, fetch_missing=fetch_missing)
+        convert_to_html(src_file, out_html, dry_run=dry_run, inline_resources=inline_resources,
+                        fetch_missing=fetch_missing, parsed=parsed)
         if (not skip_pdf) and wkhtml_path:
-            attempts = 3
+            attempts = PDF_ATTEMPTS
             last_err = None
             for attempt in range(1, attempts + 1):
                 try:
@@ -790,119 +1301,477 @@ def process_single_file(src_file: Path, out_html_root: Path, out_pdf_root: Path,
             return False, f"Conversion error: {e}; additionally failed to move: {me}"
 
 
-def walk_and_process(src_root: Path, out_html_root: Path, out_pdf_root: Path,
-                     failed_root: Path, wkhtml_path: Path,
-                     skip_pdf: bool, dry_run: bool, use_progress: bool, validate: bool,
-                     clean_sidecars: bool, inline_resources: bool, fetch_missing: bool):
-    if not src_root.exists():
-        print("Source folder not found:", src_root)
-        return
-
-    out_html_root.mkdir(parents=True, exist_ok=True)
-    out_pdf_root.mkdir(parents=True, exist_ok=True)
-    failed_root.mkdir(parents=True, exist_ok=True)
+def _start_pdf_batch(tasks: List[Tuple[str, str, str]], wkhtml_path: Path) -> Optional[PdfJob]:
+    try:
+        return start_html_to_pdf_batch([(out_html, out_pdf) for _, out_html, out_pdf in tasks], wkhtml_path)
+    except Exception:
+        # _run_pdf_batch falls back to per-file runs and reports the error
+        return None
 
-    if clean_sidecars:
-        print("Cleaning AppleDouble sidecar files (._*.webarchive) into failed folder...")
-        moved = clean_sidecars_to_failed(src_root, failed_root, dry_run=dry_run)
-        print(f"  Sidecars moved (or planned): {moved}")
 
-    all_files = gather_webarchive_files(src_root)
-    total = len(all_files)
-    if total == 0:
-        print("No .webarchive files found under:", src_root)
-        return
+def _start_pdf_stream(wkhtml_path: Path) -> Optional[PdfJob]:
+    try:
+        return start_html_to_pdf_stream(wkhtml_path)
+    except Exception:
+        # pages queued on a missing run are rendered one at a time by _run_pdf_batch
+        return None
 
-    print(f"Found {total} .webarchive files. Starting conversion{' (dry-run)' if dry_run else ''}.")
 
-    iterator = all_files
-    if use_progress:
-        if tqdm is None:
-            print("tqdm not installed; install it with: pip install tqdm")
-            iterator = all_files
+def _run_pdf_task(src_file: str, out_html: str, out_pdf: str, wkhtml_path: Path,
+                  dry_run: bool = False, job: Optional[PdfJob] = None) -> List[Tuple[str, str]]:
+    # First attempt reuses the already-running job when given; later attempts run synchronously.
+    try:
+        attempts = PDF_ATTEMPTS
+        for attempt in range(1, attempts + 1):
+            try:
+                if job is not None and attempt == 1:
+                    finish_html_to_pdf(job)
+                else:
+                    html_to_pdf(out_html, out_pdf, wkhtml_path, dry_run=dry_run)
+                break
+            except Exception:
+                if attempt < attempts:
+                    time.sleep(0.3 * attempt)
+                else:
+                    raise
+        if not dry_run:
+            log.debug(f"    PDF  -> {final_pdf_path(out_pdf)}")
+        return []
+    except Exception as e:
+        log.info(f"    PDF conversion failed for {out_html}: {e}")
+        return [(str(src_file), f"PDF error: {e}")]
+
+
+def _run_pdf_batch(tasks: List[Tuple[str, str, str]], wkhtml_path: Path,
+                   job: Optional[PdfJob]) -> List[Tuple[str, str]]:
+    if not tasks:
+        if job is not None:
+            finish_html_to_pdf_batch(job)
+        return []
+    if len(tasks) == 1:
+        src_file, out_html, out_pdf = tasks[0]
+        return _run_pdf_task(src_file, out_html, out_pdf, wkhtml_path, job=job)
+    results = finish_html_to_pdf_batch(job) if job is not None else [job] * len(tasks)
+    errors: List[Tuple[str, str]] = []
+    for (src_file, out_html, out_pdf), err in zip(tasks, results):
+        if job is not None and err is None:
+            log.debug(f"    PDF  -> {final_pdf_path(out_pdf)}")
         else:
-            iterator = tqdm(all_files, desc="Converting", unit="file", ncols=100)
+            # one bad page shouldn't sink the batch: redo the failures one at a time
+            errors.extend(_run_pdf_task(src_file, out_html, out_pdf, wkhtml_path))
+    return errors
+
+
+class Prefetcher:
+    # Reads the next `depth` source files on a background thread while the current one is
+    # converted, so the parser finds them in the OS file cache. Meant for slow sources (USB
+    # drives, network shares) where read latency dominates; the data itself is discarded.
+    def __init__(self, depth: int):
+        self.depth = depth
+        self._paths = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="webarchive-prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        buf = bytearray(PREFETCH_CHUNK)
+        while True:
+            path = self._paths.get()
+            if path is None:
+                return
+            try:
+                with open(add_long_path_prefix(path), "rb", buffering=0) as fh:
+                    while fh.readinto(buf):
+                        pass
+            except OSError:
+                pass  # the conversion itself will report unreadable files
+
+    def ahead(self, entries: Iterator[os.DirEntry]) -> Iterator[os.DirEntry]:
+        # Yields `entries` unchanged, pulling `depth` entries ahead of the consumer and
+        # queueing each one for reading as soon as it is pulled.
+        window = deque()
+        for de in entries:
+            self._paths.put(de.path)
+            window.append(de)
+            if len(window) > self.depth:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+    def close(self):
+        self._paths.put(None)
+        self._thread.join()
+
+
+def _is_up_to_date(dest: str, src_mtime: float) -> bool:
+    try:
+        st = os.stat(dest)
+    except OSError:
+        return False
+    return st.st_mtime >= src_mtime and st.st_size > 0
 
-    errors = []
-    count = 0
 
-    for src_file in iterator:
-        count += 1
-        try:
-            rel_root = src_file.parent.relative_to(src_root)
-        except Exception:
-            rel_root = Path(".")
-        rel_root_trunc = truncate_rel_parts(rel_root)
+def _entry_stat(de: os.DirEntry) -> Optional[os.stat_result]:
+    # DirEntry.stat() is served from the directory listing on Windows (no extra syscall) and
+    # cached on the entry elsewhere; the worker gets size/mtime from it instead of re-stat'ing.
+    try:
+        return de.stat(follow_symlinks=False)
+    except OSError:
+        return None
 
-        safe_stem, _ = safe_stem_with_ext(src_file.name)
-        out_html = out_html_root / rel_root_trunc / (safe_stem + ".html")
-        out_pdf = out_pdf_root / rel_root_trunc / (safe_stem + ".pdf")
 
-        try:
-            if not dry_run:
-                print(f"[{count}/{total}] Converting: {src_file}")
-            else:
-                print(f"[{count}/{total}] (dry-run) Would convert: {src_file}")
-            if not is_likely_webarchive_file(src_file):
-                print(f"    Skipping (heuristic): {src_file}")
-                errors.append((str(src_file), "heuristic validation failed"))
+class WkPool:
+    # Keeps up to `workers` wkhtmltopdf processes running. With batch_size 1 each page gets its
+    # own run; otherwise a run is started for the first page of a batch and later pages are
+    # streamed to its stdin as they arrive, until it holds batch_size pages. submit() only
+    # blocks when every slot is busy, and then only until the first run finishes. Plain Popen
+    # handles stand in for worker processes: each slot spends its time inside wkhtmltopdf,
+    # so there is nothing for extra Python processes to do.
+    def __init__(self, wkhtml_path: Path, workers: int = DEFAULT_PDF_WORKERS, batch_size: int = DEFAULT_PDF_BATCH):
+        self.wkhtml_path = wkhtml_path
+        self.workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
+        self.batch_size = max(1, batch_size or 1)
+        self.errors: List[Tuple[str, str]] = []
+        self._stream: Optional[Tuple[List[Tuple[str, str, str]], Optional[PdfJob]]] = None
+        self._running = deque()
+        self._checked_stdin = False
+
+    def submit(self, task: Tuple[str, str, str]):
+        if self.batch_size > 1 and not self._checked_stdin:
+            # probed on first use, so runs with --skip-pdf never launch wkhtmltopdf
+            self._checked_stdin = True
+            if os.path.isfile(str(self.wkhtml_path)) and not wkhtml_reads_args_from_stdin(self.wkhtml_path):
+                log.info("    wkhtmltopdf does not support --read-args-from-stdin; rendering one page per run.")
+                self.batch_size = 1
+        if self.batch_size == 1:
+            self._wait_for_slot()
+            self._running.append(([task], _start_pdf_batch([task], self.wkhtml_path)))
+            return
+        if self._stream is None:
+            self._wait_for_slot()
+            self._stream = ([], _start_pdf_stream(self.wkhtml_path))
+        tasks, job = self._stream
+        if job is None:
+            tasks.append(task)  # could not start; _run_pdf_batch renders these one by one
+        else:
+            try:
+                add_html_to_pdf_stream(job, task[1], task[2])
+                tasks.append(task)
+            except Exception:
+                # temp file, encoding or a dead process: stop feeding a run that may no longer
+                # be reading, then render this page on its own once a slot is free
+                self._seal()
+                self._wait_for_slot()
+                self.errors.extend(_run_pdf_task(*task, self.wkhtml_path))
+                return
+        if len(tasks) >= self.batch_size:
+            self._seal()
+
+    def close(self) -> List[Tuple[str, str]]:
+        # Ends any partly filled run, waits for everything and returns the collected errors.
+        self._seal()
+        while self._running:
+            self._collect(self._running.popleft())
+        return self.errors
+
+    def _seal(self):
+        if self._stream is not None:
+            if self._stream[1] is not None:
+                _end_stdin(self._stream[1])
+            self._running.append(self._stream)
+            self._stream = None
+
+    def _wait_for_slot(self):
+        # an open stream is a running wkhtmltopdf too, so it takes a slot
+        while self._running and len(self._running) + (self._stream is not None) >= self.workers:
+            done = [r for r in self._running if r[1] is None or r[1].proc.poll() is not None]
+            for r in done or [self._running[0]]:
+                self._running.remove(r)
+                self._collect(r)
+
+    def _collect(self, running):
+        tasks, job = running
+        self.errors.extend(_run_pdf_batch(tasks, self.wkhtml_path, job))
+
+
+def _init_worker(log_queue, level: int):
+    # Pool initializer, run once per worker process. The module-level WebArchive import has
+    # already happened when the worker loaded this module, and the executor keeps its workers
+    # for the whole run, so the parser is imported once per worker rather than per archive.
+    _init_worker_logging(log_queue, level)
+
+
+def _worker(src_file: str, count: int, rel_root_trunc: str, src_mtime: Optional[float],
+            out_html_root: str, out_pdf_root: str, failed_root: str, wkhtml_path: Path,
+            skip_pdf: bool, dry_run: bool, validate: bool,
+            inline_resources: bool, fetch_missing: bool,
+            defer_pdf: bool = False, src_size: Optional[int] = None) -> Tuple[List[Tuple[str, str]], Optional[Tuple[str, str, str]]]:
+    # Top-level (picklable) so it can run in a ProcessPoolExecutor. Returns the errors for this
+    # file and, when defer_pdf is set, the (src, html, pdf) task left for the caller to render.
+    # src_mtime is only passed in incremental mode; outputs newer than it are left alone.
+    # src_size comes from the scan's DirEntry and spares is_likely_webarchive_file its stats.
+    errors: List[Tuple[str, str]] = []
+    safe_stem, _ = safe_stem_with_ext(os.path.basename(src_file))
+    # plain string joins: this runs once per file and the results only feed str-based APIs
+    out_html = os.path.join(output_dir(out_html_root, rel_root_trunc), safe_stem + ".html")
+    out_pdf = os.path.join(output_dir(out_pdf_root, rel_root_trunc), safe_stem + ".pdf")
+    want_pdf = (not skip_pdf) and bool(wkhtml_path)
+
+    html_fresh = pdf_fresh = False
+    if src_mtime is not None:
+        html_fresh = _is_up_to_date(out_html, src_mtime)
+        pdf_fresh = (not want_pdf) or _is_up_to_date(final_pdf_path(out_pdf), src_mtime)
+        if html_fresh and pdf_fresh:
+            log.debug(f"[{count}] [skip] up to date: {src_file}")
+            return errors, None
+
+    try:
+        if not dry_run:
+            log.debug(f"[{count}] Converting: {src_file}")
+        else:
+            log.info(f"[{count}] (dry-run) Would convert: {src_file}")
+        if not is_likely_webarchive_file(src_file, size=src_size):
+            log.info(f"    Skipping (heuristic): {src_file}")
+            errors.append((str(src_file), "heuristic validation failed"))
+            try:
+                move_failed(src_file, failed_root, rel_root_trunc, dry_run=dry_run)
+                log.info(f"    Moved heuristic-failed .webarchive to {os.path.join(failed_root, rel_root_trunc)}")
+            except Exception as me:
+                log.info(f"    Failed to move heuristic-failed file {src_file}: {me}")
+            return errors, None
+        parsed = None
+        if validate:
+            valid, msg, parsed = is_valid_webarchive_by_parsing(src_file, dry_run=dry_run)
+            if not valid:
+                log.info(f"    Parsing validation failed for {src_file}: {msg}")
+                errors.append((str(src_file), f"parsing validation failed: {msg}"))
                 try:
                     move_failed(src_file, failed_root, rel_root_trunc, dry_run=dry_run)
-                    print(f"    Moved heuristic-failed .webarchive to {failed_root / rel_root_trunc}")
+                    log.info(f"    Moved invalid .webarchive to {os.path.join(failed_root, rel_root_trunc)}")
                 except Exception as me:
-                    print(f"    Failed to move heuristic-failed file {src_file}: {me}")
-                continue
-            if validate:
-                valid, msg = is_valid_webarchive_by_parsing(src_file, dry_run=dry_run)
-                if not valid:
-                    print(f"    Parsing validation failed for {src_file}: {msg}")
-                    errors.append((str(src_file), f"parsing validation failed: {msg}"))
-                    try:
-                        move_failed(src_file, failed_root, rel_root_trunc, dry_run=dry_run)
-                        print(f"    Moved invalid .webarchive to {failed_root / rel_root_trunc}")
-                    except Exception as me:
-                        print(f"    Failed to move invalid file {src_file}: {me}")
-                    continue
+                    log.info(f"    Failed to move invalid file {src_file}: {me}")
+                return errors, None
 
-            convert_to_html(src_file, out_html, dry_run=dry_run, inline_resources=inline_resources, fetch_missing=fetch_missing)
+        if html_fresh:
+            log.debug(f"    [skip] HTML up to date: {out_html}")
+        else:
+            convert_to_html(src_file, out_html, dry_run=dry_run, inline_resources=inline_resources,
+                            fetch_missing=fetch_missing, parsed=parsed)
             if not dry_run:
-                print(f"    HTML -> {out_html}")
-            if (not skip_pdf) and wkhtml_path:
-                try:
-                    attempts = 3
-                    last_err = None
-                    for attempt in range(1, attempts + 1):
+                log.debug(f"    HTML -> {out_html}")
+        if want_pdf and not pdf_fresh:
+            if defer_pdf and not dry_run:
+                return errors, (src_file, out_html, out_pdf)
+            errors.extend(_run_pdf_task(src_file, out_html, out_pdf, wkhtml_path, dry_run=dry_run))
+    except Exception as e:
+        log.info(f"    ERROR converting {src_file}: {e}")
+        errors.append((str(src_file), str(e)))
+        try:
+            move_failed(src_file, failed_root, rel_root_trunc, dry_run=dry_run)
+            log.info(f"    Moved failed .webarchive to {os.path.join(failed_root, rel_root_trunc)}")
+        except Exception as me:
+            log.info(f"    Failed to move failed file {src_file}: {me}")
+    return errors, None
+
+
+def _worker_batch(worker, items: List[Tuple[str, int, str, Optional[float], Optional[int]]]):
+    # One pool task for several files, so pickling and queue traffic are paid per chunk
+    # rather than per file; returns the per-file _worker results in order.
+    return [worker(src_file, count, rel_root_trunc, src_mtime, defer_pdf=True, src_size=src_size)
+            for src_file, count, rel_root_trunc, src_mtime, src_size in items]
+
+
+def walk_and_process(src_root: Path, out_html_root: Path, out_pdf_root: Path,
+                     failed_root: Path, wkhtml_path: Path,
+                     skip_pdf: bool, dry_run: bool, use_progress: bool, validate: bool,
+                     clean_sidecars: bool, inline_resources: bool, fetch_missing: bool,
+                     jobs: int = DEFAULT_JOBS, pdf_batch: int = DEFAULT_PDF_BATCH,
+                     incremental: bool = False, pdf_workers: int = DEFAULT_PDF_WORKERS,
+                     prefetch: int = DEFAULT_PREFETCH, error_log: Optional[Path] = None,
+                     count_first: bool = False):
+    # incremental defaults to False here so that callers of the function reconvert everything
+    # unless they ask otherwise; the command line is the other way round and passes
+    # incremental=not --force, so a CLI run skips up-to-date files by default.
+    if not src_root.exists():
+        log.info(f"Source folder not found: {src_root}")
+        return
+
+    out_html_root.mkdir(parents=True, exist_ok=True)
+    out_pdf_root.mkdir(parents=True, exist_ok=True)
+    failed_root.mkdir(parents=True, exist_ok=True)
+
+    log.info(f"Scanning {src_root} and converting as files are found{' (dry-run)' if dry_run else ''}.")
+
+    # the per-file code works on plain strings; convert the roots once here
+    src_root_s = os.fspath(src_root)
+    worker = functools.partial(
+        _worker,
+        out_html_root=os.fspath(out_html_root),
+        out_pdf_root=os.fspath(out_pdf_root),
+        failed_root=os.fspath(failed_root),
+        wkhtml_path=wkhtml_path,
+        skip_pdf=skip_pdf,
+        dry_run=dry_run,
+        validate=validate,
+        inline_resources=inline_resources,
+        fetch_missing=fetch_missing,
+    )
+
+    if use_progress and tqdm is None:
+        log.info("tqdm not installed; install it with: pip install tqdm")
+        use_progress = False
+
+    errors = []
+    total = 0
+    jobs = jobs if jobs and jobs > 0 else (os.cpu_count() or 1)
+    if MAX_POOL_WORKERS is not None:
+        jobs = min(jobs, MAX_POOL_WORKERS)
+    wk_pool = WkPool(wkhtml_path, workers=pdf_workers, batch_size=pdf_batch)
+
+    # Files are converted as the walk finds them. HTML is produced inline (jobs == 1) or by
+    # the process pool; either way the finished pages are handed to wk_pool, so wkhtmltopdf
+    # runs alongside the next files' HTML conversion. A progress-bar total costs a second
+    # full walk of the tree, so the files are only counted up front on request.
+    bar_total = None
+    if use_progress and count_first:
+        bar_total = count_webarchive_files(src_root, skip_sidecars=clean_sidecars)
+    found = iter_webarchive_entries(src_root)
+    sidecars_moved = 0
+    if clean_sidecars:
+        # Sidecars are moved as the same scan reaches them instead of in a separate walk.
+        log.info("Cleaning AppleDouble sidecar files (._*.webarchive) into failed folder during the scan...")
+
+        def without_sidecars(entries):
+            nonlocal sidecars_moved
+            for de in entries:
+                if not is_sidecar(de):
+                    yield de
+                elif move_sidecar(de, src_root_s, failed_root, dry_run=dry_run):
+                    sidecars_moved += 1
+
+        found = without_sidecars(found)
+    prefetcher = Prefetcher(prefetch) if prefetch > 0 and not dry_run else None
+    if prefetcher is not None:
+        found = prefetcher.ahead(found)
+    if jobs == 1:
+        iterator = found
+        if use_progress:
+            iterator = tqdm(found, total=bar_total, desc="Converting", unit="file", ncols=100)
+        for count, de in enumerate(iterator, start=1):
+            total = count
+            src_file = de.path
+            rel_root_trunc = output_rel_root(os.path.dirname(de.path), src_root_s)
+            st = _entry_stat(de)
+            src_mtime = st.st_mtime if incremental and st is not None else None
+            file_errors, pdf_task = worker(src_file, count, rel_root_trunc, src_mtime, defer_pdf=True,
+                                           src_size=st.st_size if st is not None else None)
+            errors.extend(file_errors)
+            if pdf_task:
+                wk_pool.submit(pdf_task)
+    else:
+        log.info(f"Using {jobs} worker processes.")
+        progress = tqdm(total=bar_total, desc="Converting", unit="file", ncols=100) if use_progress else None
+        log_queue = multiprocessing.Queue()
+        listener = logging.handlers.QueueListener(log_queue, *log.handlers, respect_handler_level=True)
+        listener.start()
+        try:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(log_queue, log.level)) as ex:
+                running = {}
+
+                def collect(done):
+                    for fut in done:
+                        items = running.pop(fut)
                         try:
-                            html_to_pdf(out_html, out_pdf, wkhtml_path, dry_run=dry_run)
-                            break
+                            results = fut.result()
                         except Exception as e:
-                            last_err = e
-                            if attempt < attempts:
-                                time.sleep(0.3 * attempt)
-                            else:
-                                raise
-                    if not dry_run:
-                        print(f"    PDF  -> {out_pdf_root / safe_pdf_filename(out_pdf.name)}")
-                except Exception as e:
-                    print(f"    PDF conversion failed for {out_html}: {e}")
-                    errors.append((str(src_file), f"PDF error: {e}"))
-        except Exception as e:
-            print(f"    ERROR converting {src_file}: {e}")
-            errors.append((str(src_file), str(e)))
-            try:
-                move_failed(src_file, failed_root, rel_root_trunc, dry_run=dry_run)
-                print(f"    Moved failed .webarchive to {failed_root / rel_root_trunc}")
-            except Exception as me:
-                print(f"    Failed to move failed file {src_file}: {me}")
+                            for item in items:
+                                log.info(f"    ERROR converting {item[0]}: worker failed: {e}")
+                                errors.append((item[0], f"worker failed: {e}"))
+                        else:
+                            for file_errors, pdf_task in results:
+                                errors.extend(file_errors)
+                                if pdf_task:
+                                    wk_pool.submit(pdf_task)
+                        if progress is not None:
+                            progress.update(len(items))
+
+                def submit(items):
+                    running[ex.submit(_worker_batch, worker, items)] = items
+                    if len(running) >= jobs * 4:
+                        collect(wait(running, return_when=FIRST_COMPLETED).done)
+
+                # Submit while walking so the workers start before the scan finishes, but keep
+                # only a few tasks per worker queued so finished pages reach wk_pool promptly.
+                # Chunks start at one file and double up to POOL_CHUNK_MAX: the first files
+                # reach the workers at once, and long runs amortize the per-task IPC cost.
+                # A chunk also closes at POOL_CHUNK_BYTES of source, and an archive larger than
+                # that goes alone, so one huge file never holds a chunk of small ones behind it
+                # while other workers sit idle.
+                chunk = []
+                chunk_size = 1
+                chunk_bytes = 0
+                for count, de in enumerate(found, start=1):
+                    total = count
+                    st = _entry_stat(de)
+                    src_mtime = st.st_mtime if incremental and st is not None else None
+                    src_size = st.st_size if st is not None else None
+                    rel_root_trunc = output_rel_root(os.path.dirname(de.path), src_root_s)
+                    item = (de.path, count, rel_root_trunc, src_mtime, src_size)
+                    if src_size is not None and src_size >= POOL_CHUNK_BYTES:
+                        if chunk:
+                            submit(chunk)
+                            chunk = []
+                            chunk_bytes = 0
+                        submit([item])
+                        continue
+                    chunk.append(item)
+                    chunk_bytes += src_size or 0
+                    if len(chunk) >= chunk_size or chunk_bytes >= POOL_CHUNK_BYTES:
+                        submit(chunk)
+                        chunk = []
+                        chunk_bytes = 0
+                        chunk_size = min(chunk_size * 2, POOL_CHUNK_MAX)
+                if chunk:
+                    submit(chunk)
+                while running:
+                    collect(wait(running, return_when=FIRST_COMPLETED).done)
+        finally:
+            listener.stop()
+        if progress is not None:
+            progress.close()
+    errors.extend(wk_pool.close())
+    if prefetcher is not None:
+        prefetcher.close()
+    if clean_sidecars:
+        log.info(f"  Sidecars moved (or planned): {sidecars_moved}")
+    if error_log is not None:
+        # written on every run (just the header when there were no errors), so a log left by
+        # an earlier failing run never looks current
+        write_error_log(error_log, errors)
 
-    print(f"\nDone. Scanned tree starting at: {src_root}")
-    print(f"Total .webarchive files processed: {total}")
+    if total == 0:
+        log.info(f"No .webarchive files found under: {src_root}")
+        return
+
+    log.info(f"\nDone. Scanned tree starting at: {src_root}")
+    log.info(f"Total .webarchive files processed: {total}")
     if errors:
-        print(f"Total items with errors: {len(errors)}")
-        for fpath, err in errors:
-            print(f" - {fpath}: {err}")
+        log.info(f"Total items with errors: {len(errors)}")
+        if error_log is not None:
+            log.info(f"Error list written to: {error_log}")
+        else:
+            # one record (and one write) for the whole list rather than one per failure
+            log.info("\n".join(f" - {fpath}: {err}" for fpath, err in errors))
     else:
-        print("No errors encountered.")
+        log.info("No errors encountered.")
+
+
+def write_error_log(out_csv: Path, errors: List[Tuple[str, str]]):
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_csv, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["path", "error"])
+        writer.writerows(errors)
 
 
 # ---------- CLI ----------
@@ -918,19 +1787,31 @@ def parse_args():
     p.add_argument("--dry-run", action="store_true", help="Do not write files; print what would be done")
     p.add_argument("--test-file", type=Path, help="Test single .webarchive file and exit")
     p.add_argument("--no-progress", action="store_true", help="Disable progress bar")
+    p.add_argument("--verbose", action="store_true", help="Log every file (converted HTML/PDF paths) even while the progress bar is shown")
     p.add_argument("--validate", action="store_true", help="Enable parsing validation with pywebarchive (slower)")
     p.add_argument("--clean-sidecars", action="store_true", help="Move AppleDouble sidecar files (._*.webarchive) to FAILED before processing")
     p.add_argument("--inline-resources", action="store_true", help="Write subresources locally and rewrite HTML to reference them (produces fully offline HTML for PDF)")
     p.add_argument("--fetch-missing", action="store_true", help="Attempt to download missing subresources from original URLs when archive lacks embedded bytes (requires requests)")
+    p.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Number of worker processes for conversion (0 = one per CPU, 1 = sequential)")
+    p.add_argument("--force", action="store_true", help="Reconvert every file, even when its HTML/PDF outputs are newer than the source")
+    p.add_argument("--incremental", action="store_true", help="(deprecated; no effect, incremental is now the default unless --force)")
+    p.add_argument("--pdf-batch", type=int, default=DEFAULT_PDF_BATCH, help="Render up to N HTML files per wkhtmltopdf run, streamed to it via --read-args-from-stdin as they are converted")
+    p.add_argument("--pdf-workers", type=int, default=DEFAULT_PDF_WORKERS, help="Number of wkhtmltopdf processes to run at once (0 = one per CPU)")
+    p.add_argument("--error-log", type=Path, default=None, help="Write the list of failed files to this CSV instead of printing it")
+    p.add_argument("--count-first", action="store_true", help="Count the files before converting so the progress bar shows a total and ETA (walks the source tree twice)")
+    p.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH, help="Read this many upcoming source files ahead into the OS cache (helps on USB/network sources; 0 = off)")
     return p.parse_args()
 
 
 def main():
     args = parse_args()
     use_progress = not args.no_progress
+    # Without a progress bar (or for a single test file) the per-file lines are the progress.
+    verbose = args.verbose or not use_progress or tqdm is None or bool(args.test_file)
+    setup_logging(logging.DEBUG if verbose else logging.INFO, progress=use_progress and not args.test_file)
 
     if args.test_file:
-        print("Running single-file test for:", args.test_file)
+        log.info(f"Running single-file test for: {args.test_file}")
         success, message = process_single_file(
             src_file=args.test_file,
             out_html_root=args.out_html,
@@ -944,10 +1825,10 @@ def main():
             fetch_missing=args.fetch_missing
         )
         if success:
-            print("Test conversion succeeded:", message)
+            log.info(f"Test conversion succeeded: {message}")
             return 0
         else:
-            print("Test conversion failed:", message)
+            log.info(f"Test conversion failed: {message}")
             return 2
 
     try:
@@ -963,11 +1844,18 @@ def main():
             validate=args.validate,
             clean_sidecars=args.clean_sidecars,
             inline_resources=args.inline_resources,
-            fetch_missing=args.fetch_missing
+            fetch_missing=args.fetch_missing,
+            jobs=args.jobs,
+            pdf_batch=args.pdf_batch,
+            incremental=not args.force,
+            pdf_workers=args.pdf_workers,
+            prefetch=args.prefetch,
+            error_log=args.error_log,
+            count_first=args.count_first,
         )
         return 0
     except Exception as e:
-        print("Fatal error:", e)
+        log.info(f"Fatal error: {e}")
         return 1
 
 
@@ -5,7 +5,9 @@ inspect_report.py
 - Prints summary, top N largest files, and flags problematic filenames.
 """
 import csv
+import heapq
 import os
+import re
 import sys
 import unicodedata
 from collections import Counter
@@ -14,23 +16,27 @@ CSV_NAME = "report.csv"
 TOP_N = 20
 MAX_SAFE_LEN = 200
 INVALID_CHARS = set('<>:"/\\|?*')  # Windows invalid characters
+_INVALID_RE = re.compile(r'[<>:"/\\|?*]')  # same set as INVALID_CHARS
+# every character-level problem at once (invalid, comma, control char, ".."); most names
+# match none, so they are cleared with one search
+_CHAR_PROBLEM_RE = re.compile(r'[<>:"/\\|?*,\x00-\x1f]|\.\.')
 
 def is_problematic_name(name):
     if len(name) > MAX_SAFE_LEN:
         return "TOO_LONG"
     if name.strip() != name:
         return "LEADING_TRAILING_SPACE"
-    if any(c in INVALID_CHARS for c in name):
-        return "INVALID_CHARS"
-    if "," in name:
-        return "HAS_COMMA"
-    if name.count("..") > 0:
-        return "DOUBLE_DOT"
-    # control characters
-    if any(ord(c) < 32 for c in name):
+    if _CHAR_PROBLEM_RE.search(name):
+        # something is wrong; name it, in the same order of precedence as always
+        if _INVALID_RE.search(name):
+            return "INVALID_CHARS"
+        if "," in name:
+            return "HAS_COMMA"
+        if ".." in name:
+            return "DOUBLE_DOT"
         return "CONTROL_CHAR"
-    # non-normalized unicode
-    if unicodedata.normalize("NFC", name) != name:
+    # non-normalized unicode (is_normalized answers without building the NFC copy)
+    if not unicodedata.is_normalized("NFC", name):
         return "NON_NFC"
     return None
 
@@ -41,24 +47,41 @@ def human(n):
         n /= 1024.0
     return f"{n:.1f}TB"
 
+def _field(row, i):
+    # row[i], or None when the column is absent or the row is short
+    return row[i] if i is not None and i < len(row) else None
+
 def main():
     if not os.path.exists(CSV_NAME):
         print(f"{CSV_NAME} not found", file=sys.stderr); sys.exit(1)
-    rows = []
+    # One pass over the file into per-column lists (no dict per row); everything below
+    # works on these columns.
+    paths, names, file_sizes = [], [], []
+    hm = Counter()
+    with_subs = 0
     with open(CSV_NAME, newline='', encoding='utf-8', errors='replace') as f:
-        reader = csv.DictReader(f)
-        for r in reader:
+        reader = csv.reader(f)
+        col = {name: i for i, name in enumerate(next(reader, []))}
+        i_path, i_full = col.get('path'), col.get('full_path')
+        i_size, i_subs = col.get('file_size'), col.get('subresource_count')
+        i_main = col.get('has_main_resource')
+        for row in reader:
+            path = _field(row, i_path)
             try:
-                r['file_size'] = int(r.get('file_size') or 0)
-                r['subresource_count'] = int(r.get('subresource_count') or 0)
+                size = int(_field(row, i_size) or 0)
+                subs = int(_field(row, i_subs) or 0)
             except ValueError:
-                r['file_size'] = 0
-                r['subresource_count'] = 0
-            rows.append(r)
+                size = subs = 0
+            paths.append(path)
+            file_sizes.append(size)
+            names.append(os.path.basename(path or _field(row, i_full) or ''))
+            hm[(_field(row, i_main) or '').lower()] += 1
+            if subs > 0:
+                with_subs += 1
 
-    total = len(rows)
-    total_bytes = sum(r['file_size'] for r in rows)
-    sizes = sorted(r['file_size'] for r in rows)
+    total = len(paths)
+    total_bytes = sum(file_sizes)
+    sizes = sorted(file_sizes)
     q1 = sizes[int(total*0.25)] if total>0 else 0
     q2 = sizes[int(total*0.5)] if total>0 else 0
     q3 = sizes[int(total*0.75)] if total>0 else 0
@@ -68,26 +91,25 @@ def main():
     print(f"Size quartiles: Q1={human(q1)} Q2={human(q2)} Q3={human(q3)}")
 
     # has_main_resource distribution
-    hm = Counter(r.get('has_main_resource','').lower() for r in rows)
     print("has_main_resource counts:", dict(hm))
 
     # subresource_count > 0
-    with_subs = [r for r in rows if r['subresource_count']>0]
-    print("Files reporting subresources:", len(with_subs))
+    print("Files reporting subresources:", with_subs)
 
-    # top N largest
-    top = sorted(rows, key=lambda r: r['file_size'], reverse=True)[:TOP_N]
+    # top N largest (nlargest keeps file order among equal sizes, like a stable sort)
+    top = heapq.nlargest(TOP_N, range(total), key=file_sizes.__getitem__)
     print(f"\nTop {TOP_N} largest files:")
-    for r in top:
-        print(f" {human(r['file_size']):>8}  {r['path']}")
+    for i in top:
+        print(f" {human(file_sizes[i]):>8}  {paths[i]}")
 
-    # problematic names
+    # problematic names: each distinct basename is classified once, however often it repeats
+    name_counts = Counter(names)
+    reasons = {n: is_problematic_name(n) for n in name_counts}
     probs = []
-    for r in rows:
-        basename = os.path.basename(r.get('path') or r.get('full_path') or '')
-        reason = is_problematic_name(basename)
+    for basename, path, size in zip(names, paths, file_sizes):
+        reason = reasons[basename]
         if reason:
-            probs.append((reason, r['path'], r['file_size']))
+            probs.append((reason, path, size))
     probs_by_reason = {}
     for reason, path, size in probs:
         probs_by_reason.setdefault(reason, []).append((path, size))
@@ -100,8 +122,7 @@ def main():
         print(" None detected.")
 
     # duplicates (same filename different path)
-    names = [os.path.basename(r.get('path') or r.get('full_path') or '') for r in rows]
-    dups = {n:c for n,c in Counter(names).items() if c>1}
+    dups = {n:c for n,c in name_counts.items() if c>1}
     print("\nDuplicate basenames:", len(dups))
     for n,c in list(dups.items())[:20]:
         print(f" {n}: {c} occurrences")
@@ -3,16 +3,46 @@
 from pathlib import Path
 from webarchive import WebArchive
 
-def probe(wa):
-    def maybe_attr(obj, *names):
-        for n in names:
-            if hasattr(obj, n):
-                try:
-                    return getattr(obj, n)
-                except Exception:
-                    pass
-        return None
+# Which attribute name answered a probe, per (type, candidate names), so the hasattr
+# cascade runs once per resource type instead of once per subresource.
+_RESOLVED = {}
+DATA_ATTRS = ("data", "data_bytes", "content", "html", "value")
+
+def maybe_attr(obj, *names):
+    key = (type(obj), names)
+    n = _RESOLVED.get(key)
+    if n is not None:
+        try:
+            return getattr(obj, n)
+        except Exception:
+            pass
+    for n in names:
+        if hasattr(obj, n):
+            try:
+                v = getattr(obj, n)
+            except Exception:
+                continue
+            _RESOLVED[key] = n
+            return v
+    return None
+
+def data_attr(r):
+    # The first of DATA_ATTRS holding bytes or text, or None.
+    key = (type(r), DATA_ATTRS)
+    n = _RESOLVED.get(key)
+    if n is not None:
+        v = getattr(r, n, None)
+        if isinstance(v, (bytes, bytearray, str)):
+            return v
+    for n in DATA_ATTRS:
+        if hasattr(r, n):
+            v = getattr(r, n)
+            if isinstance(v, (bytes, bytearray, str)):
+                _RESOLVED[key] = n
+                return v
+    return None
 
+def probe(wa):
     print("Top-level attributes:", [a for a in dir(wa) if not a.startswith("_")][:50])
     mr = maybe_attr(wa, "main_resource", "_main_resource", "web_main_resource")
     if mr:
@@ -20,15 +50,11 @@ def probe(wa):
         print("  url:", maybe_attr(mr, "url", "URL", "filename", "path"))
         print("  mime:", maybe_attr(mr, "mimeType", "MIMEType", "contentType"))
         # try to find data bytes
-        for key in ("data", "data_bytes", "content", "html", "value"):
-            if hasattr(mr, key):
-                val = getattr(mr, key)
-                if isinstance(val, (bytes, bytearray)):
-                    print("  data: bytes length=", len(val))
-                    break
-                elif isinstance(val, str):
-                    print("  data: text length=", len(val))
-                    break
+        val = data_attr(mr)
+        if isinstance(val, (bytes, bytearray)):
+            print("  data: bytes length=", len(val))
+        elif isinstance(val, str):
+            print("  data: text length=", len(val))
     else:
         print("No main resource found")
 
@@ -47,14 +73,8 @@ def probe(wa):
                 for i, r in enumerate(items, 1):
                     url = maybe_attr(r, "url", "URL", "filename", "path", "src")
                     mime = maybe_attr(r, "mimeType", "MIMEType", "contentType")
-                    size = None
-                    for key in ("data", "data_bytes", "content", "html", "value"):
-                        if hasattr(r, key):
-                            v = getattr(r, key)
-                            if isinstance(v, (bytes, bytearray)):
-                                size = len(v); break
-                            if isinstance(v, str):
-                                size = len(v); break
+                    v = data_attr(r)
+                    size = len(v) if v is not None else None
                     print(f"  [{i}] url={url!r} mime={mime!r} data_len={size}")
     if not found:
         print("No subresources found via known attributes")
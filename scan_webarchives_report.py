@@ -1,170 +1,172 @@
 #!/usr/bin/env python3
 # scan_webarchives_report.py
-# Usage: pip install pywebarchive
+# Usage: standard library only (reads the .webarchive plists directly)
 # Example:
 #   python scan_webarchives_report.py --src "D:\usbwork" --out report.csv
 
 import csv
 import os
-import sys
+import plistlib
 import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 
-try:
-    from webarchive import WebArchive
-except Exception:
-    WebArchive = None
+# ProcessPoolExecutor raises ValueError for max_workers > 61 on Windows
+MAX_POOL_WORKERS = 61 if os.name == "nt" else None
+# plistlib's binary plist parser is pure Python and holds the GIL, so files are inspected in
+# worker processes, handed out POOL_CHUNK at a time to keep the pickling overhead per file low
+DEFAULT_WORKERS = os.cpu_count() or 1
+if MAX_POOL_WORKERS is not None:
+    DEFAULT_WORKERS = min(DEFAULT_WORKERS, MAX_POOL_WORKERS)
+POOL_CHUNK = 32
+REPORT_FIELDS = ["path", "full_path", "file_size", "has_main_resource", "subresource_count", "largest_subresource_bytes"]
+FLUSH_EVERY = 1000  # rows between explicit flushes, so a long scan's CSV fills in as it goes
 
 # Windows long-path helper (keeps behavior consistent with your other scripts)
 USE_LONG_PATH_PREFIX = True
 def add_long_path_prefix(p: str) -> str:
     p = os.path.abspath(p)
-    if os.name != 'nt' or not USE_LONG_PATH_PREFIX:
-        return p
     if p.startswith('\\\\?\\'):
         return p
     if p.startswith('\\\\'):
         return '\\\\?\\UNC\\' + p.lstrip('\\')
     return '\\\\?\\' + p
 
+if os.name != 'nt' or not USE_LONG_PATH_PREFIX:
+    # Nothing to prefix: the platform can't change mid-run, so decide once at import.
+    add_long_path_prefix = os.path.abspath
+
 def inspect_webarchive(path: Path) -> Tuple[bool, int, Optional[int]]:
     """
     Returns (has_main_resource, subresource_count, largest_subresource_bytes or None)
-    If pywebarchive is not available, raises RuntimeError.
+    A .webarchive is a plist, so it is read directly with plistlib; no pywebarchive
+    objects are built and no attribute names need probing.
     """
-    if WebArchive is None:
-        raise RuntimeError("pywebarchive not installed. Install with: pip install pywebarchive")
-
     try:
-        wa = WebArchive(add_long_path_prefix(str(path)))
-    except Exception as e:
+        with open(add_long_path_prefix(str(path)), "rb") as f:
+            d = plistlib.load(f)
+    except Exception:
         # treat as unreadable
         return False, 0, None
+    if not isinstance(d, dict):
+        return False, 0, None
 
-    def maybe_attr(obj, *names):
-        for n in names:
-            if hasattr(obj, n):
-                try:
-                    return getattr(obj, n)
-                except Exception:
-                    pass
-        return None
+    has_main = isinstance(d.get("WebMainResource"), dict)
+    subs = d.get("WebSubresources")
+    if not isinstance(subs, list):
+        subs = []
+    largest = 0
+    for r in subs:
+        if isinstance(r, dict):
+            data = r.get("WebResourceData")
+            if isinstance(data, (bytes, bytearray)) and len(data) > largest:
+                largest = len(data)
 
-    mr = maybe_attr(wa, "main_resource", "_main_resource", "web_main_resource")
-    has_main = mr is not None
+    return has_main, len(subs), (largest or None)
 
-    # gather subresources from several likely attributes
-    sub_count = 0
-    largest = 0
-    found_any = False
-    for attr in ("subresources", "_subresources", "resources", "web_resources", "WebResources", "resource_count", "subframe_archives"):
-        if hasattr(wa, attr):
-            try:
-                col = getattr(wa, attr)
-            except Exception:
-                continue
-            if col is None:
-                continue
-            # attempt to iterate safely
-            try:
-                items = list(col) if not isinstance(col, int) else []
-            except Exception:
-                # fallback: try calling get_subresource / resource_count if available
-                items = []
-            if items:
-                for r in items:
-                    found_any = True
-                    sub_count += 1
-                    # probe for bytes-like fields
-                    size = None
-                    for key in ("data", "data_bytes", "content", "html", "value"):
-                        if hasattr(r, key):
-                            try:
-                                v = getattr(r, key)
-                                if isinstance(v, (bytes, bytearray)):
-                                    size = len(v); break
-                                if isinstance(v, str):
-                                    size = len(v); break
-                            except Exception:
-                                pass
-                    if size is not None and size > largest:
-                        largest = size
-    if not found_any:
-        # if library exposes resource_count and get_subresource, try those
+def iter_webarchive_entries(src: Path):
+    # os.scandir walk in os.walk's top-down order; yields the DirEntry of each .webarchive.
+    # The listing already says which entries are directories, and on Windows it carries
+    # the size too, so no per-file stat is needed to classify or size them.
+    stack = [str(src)]
+    while stack:
+        subdirs = []
         try:
-            rc = getattr(wa, "resource_count", None)
-            if isinstance(rc, int) and rc > 0:
-                sub_count = rc
-                # try to sample several subresources to find sizes
-                for i in range(min(10, rc)):
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
                     try:
-                        r = wa.get_subresource(i)
-                        size = None
-                        for key in ("data", "data_bytes", "content", "html", "value"):
-                            if hasattr(r, key):
-                                v = getattr(r, key)
-                                if isinstance(v, (bytes, bytearray)):
-                                    size = len(v); break
-                                if isinstance(v, str):
-                                    size = len(v); break
-                        if size is not None and size > largest:
-                            largest = size
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-
-    if largest == 0:
-        largest = None
-
-    return has_main, sub_count, largest
-
-def scan_folder(src: Path, out_csv: Path):
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if not entry.is_symlink():  # like os.walk(followlinks=False)
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(".webarchive"):
+                        yield entry
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+def entry_size(entry: os.DirEntry) -> Optional[int]:
+    try:
+        return entry.stat().st_size
+    except Exception:
+        return None
+
+def report_row(path: str, size: Optional[int], src: Path) -> list:
+    p = Path(path)
+    try:
+        has_main, sub_count, largest = inspect_webarchive(p)
+    except Exception as e:
+        has_main, sub_count, largest = False, 0, None
+    # values in REPORT_FIELDS order
+    return [
+        str(p.relative_to(src)),
+        str(p),
+        size if size is not None else "",
+        "yes" if has_main else "no",
+        sub_count,
+        largest if largest is not None else "",
+    ]
+
+def report_rows(items: List[Tuple[str, Optional[int]]], src: Path) -> list:
+    # Top-level (picklable) so a process pool can run it on a chunk of (path, size) pairs.
+    return [report_row(path, size, src) for path, size in items]
+
+def iter_report_rows(src: Path, workers: int = DEFAULT_WORKERS):
+    # Rows in walk order as files are inspected. With workers > 1 a bounded window of
+    # chunks is in flight on a process pool, so memory stays flat however big the tree is.
+    # DirEntry objects don't pickle; they are sized here and sent as (path, size).
+    entries = iter_webarchive_entries(src)
+    if MAX_POOL_WORKERS is not None:
+        workers = min(workers, MAX_POOL_WORKERS)
+    if workers <= 1:
+        for entry in entries:
+            yield report_row(entry.path, entry_size(entry), src)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        window = deque()
+        chunk = []
+        for entry in entries:
+            chunk.append((entry.path, entry_size(entry)))
+            if len(chunk) >= POOL_CHUNK:
+                window.append(ex.submit(report_rows, chunk, src))
+                chunk = []
+                if len(window) >= workers * 2:
+                    yield from window.popleft().result()
+        if chunk:
+            window.append(ex.submit(report_rows, chunk, src))
+        while window:
+            yield from window.popleft().result()
+
+def scan_folder(src: Path, out_csv: Path, workers: int = DEFAULT_WORKERS):
     src = src.resolve()
-    rows = []
-    for root, dirs, files in os.walk(src):
-        for fn in files:
-            if fn.lower().endswith(".webarchive"):
-                p = Path(root) / fn
-                try:
-                    size = p.stat().st_size
-                except Exception:
-                    size = None
-                try:
-                    has_main, sub_count, largest = inspect_webarchive(p)
-                except Exception as e:
-                    has_main, sub_count, largest = False, 0, None
-                rows.append({
-                    "path": str(p.relative_to(src)),
-                    "full_path": str(p),
-                    "file_size": size if size is not None else "",
-                    "has_main_resource": "yes" if has_main else "no",
-                    "subresource_count": sub_count,
-                    "largest_subresource_bytes": largest if largest is not None else ""
-                })
-    # write CSV
     out_csv.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    # rows are written as they arrive rather than collected first
     with open(out_csv, "w", newline="", encoding="utf-8") as fh:
-        writer = csv.DictWriter(fh, fieldnames=["path","full_path","file_size","has_main_resource","subresource_count","largest_subresource_bytes"])
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
-    print(f"Wrote {len(rows)} records to {out_csv}")
+        writer = csv.writer(fh)
+        writer.writerow(REPORT_FIELDS)
+        for row in iter_report_rows(src, workers):
+            writer.writerow(row)
+            count += 1
+            if count % FLUSH_EVERY == 0:
+                fh.flush()
+    print(f"Wrote {count} records to {out_csv}")
 
 def parse_args():
     import argparse
     p = argparse.ArgumentParser(prog="scan_webarchives_report.py", description="Scan folder of .webarchive files and emit CSV report")
     p.add_argument("--src", type=Path, required=True, help="Root folder to scan")
     p.add_argument("--out", type=Path, default=Path.cwd() / "webarchive_report.csv", help="Output CSV path")
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Worker processes inspecting files (default {DEFAULT_WORKERS}, one per CPU; 1 = serial)")
     return p.parse_args()
 
 def main():
     args = parse_args()
-    if WebArchive is None:
-        print("pywebarchive not installed. Install with: pip install pywebarchive", file=sys.stderr)
-        sys.exit(2)
-    scan_folder(args.src, args.out)
+    scan_folder(args.src, args.out, workers=args.workers)
 
 if __name__ == "__main__":
     main()